@@ -1,35 +1,31 @@
 import streamlit as st
 import plotly.express as px
 import pandas as pd
-from config import train_type_lookup
+import numpy as np
+from support_functions.dashboard import GroupTable, view_mask
+from support_functions.master_list import RANGE_COLUMNS, range_mask
 
 
-def is_superfast(train_number: str) -> bool:
-    """Check if a train number qualifies as superfast."""
-    if len(train_number) >= 1 and train_number[0] == "2":
-        return True
-    if len(train_number) >= 2 and train_number[0] in "012" and train_number[1] == "2":
-        return True
-    return False
+RANGE_TABLE_COLUMNS = [
+    "Train No", "Train Name", "Train Type", "Zone", "From", "Dep", "To", "Arr",
+    "Duration", "Distance", "Speed", "Halts", "Days", "Classes",
+]
 
 
-def generate_bar_chart(df: pd.DataFrame, group_col: str, label: str):
-    """Create vertical bar chart with longest bar on the left and unique colors."""
-    group = df.groupby(group_col).agg({
-        "Train No": lambda x: list(x)
-    }).reset_index()
-    group["Count"] = group["Train No"].apply(len)
-    group = group[[group_col, "Count", "Train No"]]
-    group = group.sort_values("Count", ascending=False)
+@st.cache_data(show_spinner=False, max_entries=32)
+def bar_chart_figure(version: str, view: str, label: str, height: int, _group: pd.DataFrame) -> dict:
+    """Plotly bar chart of a group table as a figure dict; built once per dataset version and view.
 
+    st.cache_data hands every caller its own copy, so no session can change another's chart.
+    """
     fig = px.bar(
-        group,
-        x=group_col,
+        _group,
+        x=label,
         y="Count",
-        color=group_col,  # Unique color per bar
+        color=label,  # Unique color per bar
         title=f"Train Count by {label}",
         text="Count",
-        height=650,
+        height=height,
         width=600
     )
 
@@ -42,51 +38,74 @@ def generate_bar_chart(df: pd.DataFrame, group_col: str, label: str):
         showlegend=True
     )
     fig.update_traces(textposition="outside")
-
-    col1, dummy, col2 = st.columns([4, 0.3, 2])
-    col1.plotly_chart(fig, use_container_width=True)
-    col2.dataframe(
-        group.rename(columns={
-            "Train No": "List of Train Nos",
-            group_col: label
-        }),
-        use_container_width=True,
-        hide_index=True
-    )
-
+    return fig.to_dict()
 
 
+def generate_bar_chart(table: GroupTable, label: str, version: str, view: str, height: int = 650):
+    """Create vertical bar chart with longest bar on the left and unique colors."""
+    group = table.frame(label)
+    fig = bar_chart_figure(version, view, label, height, group)
 
-def home_ui(master_train_df: pd.DataFrame, station_df: pd.DataFrame):
+    col1, dummy, col2 = st.columns([4, 0.3, 2])
+    col1.plotly_chart(fig, use_container_width=True)
+    col2.dataframe(group, use_container_width=True, hide_index=True)
+
+
+def range_filter_ui(master_train_df: pd.DataFrame, view: str):
+    """Trains of the view within distance / speed / duration ranges (typed columns of master_list.py)."""
+    con = st.container(border=True)
+    if not con.checkbox("**🔎 Find trains by distance, speed and duration**", key=f"home_{view}_ranges_show"):
+        return
+    columns = [column for column in RANGE_COLUMNS if column in master_train_df]
+    if not columns:
+        con.error("master_list.csv has no Duration, Distance or Speed columns to filter on")
+        return
+    trains = master_train_df[view_mask(master_train_df, view)]
+
+    ranges = {}
+    for col, column in zip(con.columns(len(columns)), columns):
+        label, unit = RANGE_COLUMNS[column]
+        values = trains[column].to_numpy(dtype=float, na_value=np.nan)
+        scale = 60 if column == "duration_min" else 1  # duration slider in hours
+        top = max(int(np.ceil(np.nanmax(values) / scale)) if np.isfinite(values).any() else 0, 1)
+        low, high = col.slider(f"**{label} ({unit})**", 0, top, (0, top), key=f"home_{view}_{column}")
+        # An untouched slider doesn't filter, so trains without that figure still show
+        if (low, high) != (0, top):
+            ranges[column] = (low * scale if low > 0 else None, high * scale if high < top else None)
+
+    matching = trains[range_mask(trains, ranges)]
+    con.write(f"**{len(matching)} trains** match")
+    con.dataframe(matching[[c for c in RANGE_TABLE_COLUMNS if c in matching]], use_container_width=True, hide_index=True)
+
+
+def dashboard_ui(dashboard, master_train_df, view: str, chart_height: int = 650):
+    """Render one view of the precomputed Home aggregates (support_functions/dashboard.py)."""
     st.subheader("🏠 Overview Metrics")
-
-    # Basic metrics
-    num_trains = master_train_df["Train No"].nunique()
-    num_stations = station_df["stationCode"].nunique()
-    num_zones = master_train_df["Zone"].nunique()
-    num_train_types = master_train_df["Train Type"].nunique()
-    num_superfast = master_train_df["Train No"].astype(str).apply(is_superfast).sum()
-
-    col1, col2, col3, col4, col5 = st.columns(5)
-    col1.metric("Trains", num_trains)
-    col2.metric("Stations", num_stations)
-    col3.metric("Superfast Trains", num_superfast)
-    col4.metric("Zones", num_zones)
-    col5.metric("Train Types", num_train_types)
+    aggregates = dashboard.views[view]
 
     # Ensure required columns exist
-    required_cols = {"Train No", "Train Type", "Zone"}
-    if not required_cols.issubset(master_train_df.columns):
+    if aggregates is None:
         st.error("Uploaded file must contain columns: 'Train No', 'Train Type', 'Zone'")
         st.stop()
 
-    # Map full train type names using lookup
-    master_train_df["Train-Type"] = master_train_df["Train Type"].map(train_type_lookup).fillna(master_train_df["Train Type"])
+    # Basic metrics
+    metrics = aggregates.metrics
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Trains", metrics["Trains"])
+    col2.metric("Stations", metrics["Stations"])
+    col3.metric("Superfast Trains", metrics["Superfast Trains"])
+    col4.metric("Zones", metrics["Zones"])
+    col5.metric("Train Types", metrics["Train Types"])
+    range_filter_ui(master_train_df, view)
 
     st.markdown("---")
     st.subheader("🚉 Train Distribution by Train Type")
-    generate_bar_chart(master_train_df, "Train-Type", "Train Type")
+    generate_bar_chart(aggregates.by_type, "Train Type", dashboard.version, view, chart_height)
 
     st.markdown("---")
     st.subheader("🗺️ Train Distribution by Zone")
-    generate_bar_chart(master_train_df, "Zone", "Zone")
+    generate_bar_chart(aggregates.by_zone, "Zone", dashboard.version, view, chart_height)
+
+
+def home_ui(dashboard, master_train_df):
+    dashboard_ui(dashboard, master_train_df, "all")
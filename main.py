@@ -8,12 +8,26 @@ from search_by_station import search_by_station_ui
 from search_by_train_unreserved import search_by_train_unreserved
 from search_by_route_unreserved import route_search_ui_unreserved, build_timetable_unreserved
 from search_by_station_unreserved import search_by_station_ui_unreserved
+from search_by_journey import journey_planner_ui
 from home import home_ui
 from home_reserved import home_ui_reserved
 from home_unreserved import home_ui_unreserved
-from pnr_status import check_pnr_status
+from pnr_status import check_pnr_status, bulk_pnr_status, pnr_service_stats
+from support_functions.snapshot import read_table, read_schedule
+from support_functions.train_summary import build_train_summary
+from support_functions.text_index import TrigramIndex
+from support_functions.station_search import StationSearch
+from support_functions.journey_planner import JourneyPlanner
+from support_functions.connection_scan import ConnectionScan
+from support_functions.direct_matrix import DirectMatrix
+from support_functions.spatial_index import StationKDTree
+from support_functions.dashboard import build_dashboard
+from support_functions.master_list import typed_master_list
+from support_functions import perf
 
 st.set_page_config(page_title="Indian Railways", layout="wide", page_icon="🚊")
+# Stage timings for this rerun (RAIL_PERF=1 or ?perf=1); shown in the sidebar at the end
+perf.begin_run(perf.DEFAULT_ENABLED or st.query_params.get("perf") == "1")
 
 def get_train_labels(train_df):
     train_df = train_df.copy()
@@ -24,20 +38,60 @@ def get_train_labels(train_df):
 
 @st.cache_data
 def load_data():
+    perf.cache_miss()
     pwd = os.getcwd()
-    master_train_df = pd.read_csv(f"{pwd}/database/master_list.csv", low_memory=False)
-    train_df = pd.read_csv(f"{pwd}/database/reserved_train_schedule.csv", low_memory=False)
-    unreserved_train_df = pd.read_csv(f"{pwd}/database/unreserved_train_schedule.csv", low_memory=False)
+    # read_table / read_schedule serve database/.snapshot/ when it matches the CSVs
+    # Typed minutes / km / km/h / bitmask columns next to master_list's display text
+    master_train_df = typed_master_list(read_table(f"{pwd}/database/master_list.csv"))
+    train_df, stop_times = read_schedule(f"{pwd}/database/reserved_train_schedule.csv")
+    unreserved_train_df, unreserved_stop_times = read_schedule(f"{pwd}/database/unreserved_train_schedule.csv")
     
-    station_df = pd.read_csv(f"{pwd}/database/station_index_with_coords.csv", low_memory=False)
+    station_df = read_table(f"{pwd}/database/station_index_with_coords.csv")
     station_df = station_df.drop_duplicates(subset="stationCode", keep="first")    
     station_df["stationCode"] = station_df["stationCode"].str.upper()
     station_df["stationName"] = station_df["stationName"].str.upper()
     station_df["label"] = station_df["stationCode"] + " - " + station_df["stationName"]
+    # Ranked lookup behind the station pickers
+    station_search = StationSearch(station_df)
+    # Spatial index for the nearby-stations search
+    station_tree = StationKDTree.from_station_df(station_df)
+
+    # One row per train with end-to-end figures, shared by all search pages
+    train_summary = build_train_summary(train_df, stop_times)
+    unreserved_train_summary = build_train_summary(unreserved_train_df, unreserved_stop_times)
+
+    # Substring index over train number and name for the train search box
+    train_search_index = TrigramIndex(train_summary["Train No"], train_summary["Train Name"])
+    unreserved_train_search_index = TrigramIndex(unreserved_train_summary["Train No"], unreserved_train_summary["Train Name"])
+
+    # RAPTOR arrays for the multi-leg Journey Planner
+    journey_planner = JourneyPlanner.from_summary(stop_times, train_summary)
+    unreserved_journey_planner = JourneyPlanner.from_summary(unreserved_stop_times, unreserved_train_summary)
+    # Departure-sorted connections for earliest-arrival / 24h profile queries
+    connection_scan = ConnectionScan.from_summary(stop_times, train_summary)
+    unreserved_connection_scan = ConnectionScan.from_summary(unreserved_stop_times, unreserved_train_summary)
+    # Home page counts and group tables, rendered as is on every rerun
+    dashboard = build_dashboard(master_train_df, station_df)
+    # Direct-train counts per station pair, for the route pages' To station list
+    direct_matrix = DirectMatrix(stop_times)
+    unreserved_direct_matrix = DirectMatrix(unreserved_stop_times)
+
+    return (
+        master_train_df, train_df, station_df, unreserved_train_df,
+        stop_times, unreserved_stop_times, train_summary, unreserved_train_summary,
+        train_search_index, unreserved_train_search_index, station_search,
+        journey_planner, unreserved_journey_planner, connection_scan, unreserved_connection_scan,
+        direct_matrix, unreserved_direct_matrix, station_tree, dashboard,
+    )
 
-    return master_train_df, train_df, station_df, unreserved_train_df
-
-master_train_df, train_df, station_df, unreserved_train_df = load_data()
+with perf.stage("load_data", cached=True):
+    (
+        master_train_df, train_df, station_df, unreserved_train_df,
+        stop_times, unreserved_stop_times, train_summary, unreserved_train_summary,
+        train_search_index, unreserved_train_search_index, station_search,
+        journey_planner, unreserved_journey_planner, connection_scan, unreserved_connection_scan,
+        direct_matrix, unreserved_direct_matrix, station_tree, dashboard,
+    ) = load_data()
 
 col1, col2 = st.columns([2, 5])
 
@@ -62,11 +116,11 @@ with col2:
 if selected_tab == "Home":
     st.write("__________")
     st.write("")
-    home_ui(master_train_df, station_df)
+    home_ui(dashboard, master_train_df)
  
 elif selected_tab == "Reserved Trains":   
-    options_reserved=["Home", "Train No Search", "Trains Between Stations", "Trains At Station"]
-    icons_reserved=["house", "train-lightrail-front", "map", "geo"]
+    options_reserved=["Home", "Train No Search", "Trains Between Stations", "Trains At Station", "Journey Planner"]
+    icons_reserved=["house", "train-lightrail-front", "map", "geo", "signpost-split"]
     
     selected_reserved_tab = option_menu(
         menu_title=None,  # No title for the top-level menu
@@ -80,20 +134,23 @@ elif selected_tab == "Reserved Trains":
     if selected_reserved_tab == "Home":
         st.write("__________")
         st.write("")
-        home_ui_reserved(master_train_df, station_df)
+        home_ui_reserved(dashboard, master_train_df)
 
     elif selected_reserved_tab == "Train No Search":
-        search_by_train(train_df)
+        search_by_train(train_df, stop_times, train_summary, train_search_index)
 
     elif selected_reserved_tab == "Trains Between Stations":
-        route_search_ui(train_df, station_df)
+        route_search_ui(train_df, station_search, stop_times, train_summary, direct_matrix)
 
     elif selected_reserved_tab == "Trains At Station":
-        search_by_station_ui(train_df, station_df, build_timetable)
+        search_by_station_ui(train_df, station_search, build_timetable, stop_times, train_summary, journey_planner, station_df, station_tree)
+
+    elif selected_reserved_tab == "Journey Planner":
+        journey_planner_ui(station_search, journey_planner, connection_scan, key="journey")
     
 elif selected_tab == "Unreserved Trains":
-    options_unreserved=["Home", "Train No Search", "Trains Between Stations", "Trains At Station"]
-    icons_unreserved=["house", "train-lightrail-front", "map", "geo"]
+    options_unreserved=["Home", "Train No Search", "Trains Between Stations", "Trains At Station", "Journey Planner"]
+    icons_unreserved=["house", "train-lightrail-front", "map", "geo", "signpost-split"]
     
     selected_unreserved_tab = option_menu(
         menu_title=None,  # No title for the top-level menu
@@ -107,16 +164,23 @@ elif selected_tab == "Unreserved Trains":
     if selected_unreserved_tab == "Home":
         st.write("__________")
         st.write("")
-        home_ui_unreserved(master_train_df, station_df)
+        home_ui_unreserved(dashboard, master_train_df)
 
     elif selected_unreserved_tab == "Train No Search":
-        search_by_train_unreserved(unreserved_train_df)
+        search_by_train_unreserved(unreserved_train_df, unreserved_stop_times, unreserved_train_summary, unreserved_train_search_index)
 
     elif selected_unreserved_tab == "Trains Between Stations":
-        route_search_ui_unreserved(unreserved_train_df, station_df)
+        route_search_ui_unreserved(unreserved_train_df, station_search, unreserved_stop_times, unreserved_train_summary, unreserved_direct_matrix)
 
     elif selected_unreserved_tab == "Trains At Station":
-        search_by_station_ui_unreserved(unreserved_train_df, station_df, build_timetable)
+        search_by_station_ui_unreserved(unreserved_train_df, station_search, build_timetable, unreserved_stop_times, unreserved_train_summary, unreserved_journey_planner, station_df, station_tree)
+
+    elif selected_unreserved_tab == "Journey Planner":
+        journey_planner_ui(station_search, unreserved_journey_planner, unreserved_connection_scan, key="journey_unreserved")
         
 if selected_tab == "PNR Status":
-    check_pnr_status()
\ No newline at end of file
+    check_pnr_status()
+    bulk_pnr_status()
+    pnr_service_stats()
+
+perf.end_run(selected_tab)
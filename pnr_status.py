@@ -1,10 +1,61 @@
-import requests
 import streamlit as st
 import pandas as pd
 import warnings
+from support_functions.pnr_client import CircuitOpenError, PNRClient, PNRError, valid_pnr
+from support_functions import perf
 
 warnings.filterwarnings("ignore")
 
+@st.cache_resource
+def pnr_client():
+    # One pooled session and response cache shared by every session of the app
+    return PNRClient()
+
+
+def bulk_pnr_status():
+    # Several PNRs at once, looked up concurrently through the same client
+    with st.expander("📋 Check several PNRs"):
+        with st.form("pnr_bulk_form"):
+            text = st.text_area("One 10-digit PNR per line (or comma separated)")
+            submitted = st.form_submit_button("Check All")
+        if not submitted:
+            return
+        pnrs = [p.strip() for p in text.replace(",", "\n").splitlines() if p.strip()]
+        invalid = [p for p in pnrs if not valid_pnr(p)]
+        if invalid:
+            st.warning(f"Skipping invalid PNR(s): {', '.join(invalid)}")
+        pnrs = [p for p in pnrs if valid_pnr(p)]
+        if not pnrs:
+            return
+
+        with st.spinner(f"Fetching {len(pnrs)} PNR(s)..."):
+            results = pnr_client().check_many(pnrs)
+
+        rows = []
+        for pnr, result in results.items():
+            if isinstance(result, PNRError):
+                rows.append({"PNR Number": pnr, "Status": "❌ Failed to fetch"})
+                continue
+            data = result.data
+            if not data.get("success", False):
+                rows.append({"PNR Number": pnr, "Status": "❌ No data found"})
+                continue
+            pnr_data = data.get("data", {})
+            passengers = pnr_data.get("passengerList", [])
+            rows.append({
+                "PNR Number": pnr,
+                "Status": f"⚠️ As of {result.age / 60:.0f} min ago" if result.stale else "✅",
+                "Train Number": pnr_data.get("trainNumber"),
+                "Train Name": pnr_data.get("trainName"),
+                "Date of Journey": pnr_data.get("dateOfJourney"),
+                "From": pnr_data.get("sourceStation"),
+                "To": pnr_data.get("destinationStation"),
+                "Chart Status": pnr_data.get("chartStatus"),
+                "Current Status": ", ".join(str(p.get("currentStatusDetails") or p.get("currentStatus")) for p in passengers),
+            })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
 def check_pnr_status():
     st.subheader("🔍 Check IRCTC PNR Status")
 
@@ -13,25 +64,23 @@ def check_pnr_status():
         submitted = st.form_submit_button("Check Status")
 
     if submitted:
-        if not (pnr.isdigit() and len(pnr) == 10):
+        if not valid_pnr(pnr):
             st.error("❗ Please enter a valid 10-digit numeric PNR number.")
             return
 
-        # === API Call ===
-        url = f"https://irctc-indian-railway-pnr-status.p.rapidapi.com/getPNRStatus/{pnr}"
-        headers = {
-            "x-rapidapi-key": "bab0ed34damsh6e9ffde2dc9e481p11cafajsn8a09a681672b",
-            "x-rapidapi-host": "irctc-indian-railway-pnr-status.p.rapidapi.com"
-        }
-
-        with st.spinner("Fetching PNR details..."):
+        # === API Call (pooled session, cached per PNR, bounded retries) ===
+        with st.spinner("Fetching PNR details..."), perf.stage("pnr_lookup"):
             try:
-                response = requests.get(url, headers=headers, verify=False, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-            except Exception as e:
+                result = pnr_client().lookup(pnr)
+            except CircuitOpenError:
+                st.error("❌ The PNR service is not responding right now. Please try again in a minute.")
+                return
+            except PNRError:
                 st.error("❌ Failed to fetch data from the API.")
                 return
+        data = result.data
+        if result.stale:
+            st.info(f"ℹ️ Showing the status fetched {result.age / 60:.0f} min ago; a fresh one is on its way, check again shortly.")
 
         # === Check if response is successful ===
         if not data.get("success", False):
@@ -82,3 +131,20 @@ def check_pnr_status():
             st.dataframe(passenger_df[cols], use_container_width=True)
         else:
             st.info("No passenger information available.")
+
+
+def pnr_service_stats():
+    # Health of the upstream PNR service as seen by this app process
+    client = pnr_client()
+    with st.expander("📈 PNR service health"):
+        stats = client.metrics.snapshot()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Circuit", client.breaker.state.replace("_", "-").title())
+        rate = stats["upstream_error_rate"]
+        col2.metric("Upstream Error Rate", "-" if rate is None else f"{rate:.0%}")
+        col3.metric("Upstream p99", "-" if stats["upstream"]["p99_ms"] is None else f"≤ {stats['upstream']['p99_ms']:g} ms")
+        col4.metric("Lookup p99", "-" if stats["lookup"]["p99_ms"] is None else f"≤ {stats['lookup']['p99_ms']:g} ms")
+        histograms = pd.DataFrame({name: stats[name]["buckets_ms"] for name in ("upstream", "lookup")})
+        histograms.index.name = "≤ ms"
+        st.dataframe(histograms, use_container_width=True)
+        st.json(stats["counters"], expanded=False)
@@ -0,0 +1,103 @@
+import datetime
+import time
+
+import streamlit as st
+from support_functions.connection_scan import profile_frame
+from support_functions.journey_planner import plan_journeys, reachable_frame
+from support_functions.station_search import PLACEHOLDER
+from support_functions.support_modules import isochrone_plot
+from support_functions.train_summary import DAYS
+
+
+def journey_planner_ui(station_search, planner, connection_scan, key="journey"):
+    # key keeps the reserved and unreserved tabs' widgets apart
+    ss = st.session_state
+    st.subheader("🧭 Journey Planner (with changes)")
+    con = st.container(border=True)
+    col1, _, col2 = con.columns([2, 0.5, 2])
+
+    from_query = col1.text_input("**From Station**", key=f"{key}_from_query", placeholder=PLACEHOLDER)
+    from_station = col1.selectbox(
+        "From Station",
+        [None] + station_search.options(from_query, selected=ss.get(f"{key}_from")),
+        key=f"{key}_from",
+        label_visibility="collapsed",
+    )
+    to_query = col2.text_input("**To Station**", key=f"{key}_to_query", placeholder=PLACEHOLDER)
+    to_station = col2.selectbox(
+        "To Station",
+        [None] + station_search.options(to_query, selected=ss.get(f"{key}_to"), exclude=from_station),
+        key=f"{key}_to",
+        label_visibility="collapsed",
+    )
+
+    col11, col12, col13, col14 = con.columns(4)
+    day = col11.selectbox("**Day**", DAYS, index=datetime.date.today().isoweekday() % 7, key=f"{key}_day")
+    leave_after = col12.time_input("**Leave after**", datetime.time(0, 0), step=900, key=f"{key}_time")
+    max_changes = col13.slider("**Max changes**", 0, 3, 2, key=f"{key}_changes")
+    min_connection = col14.number_input(
+        "**Min connection (min)**", min_value=0, max_value=720, value=30, step=5, key=f"{key}_connection"
+    )
+
+    if not (from_station and to_station):
+        con.info("Please select both From and To stations.")
+        return
+
+    start = time.perf_counter()
+    legs_df = plan_journeys(
+        planner,
+        station_search.code(from_station),
+        station_search.code(to_station),
+        day,
+        leave_after.strftime("%H:%M"),
+        max_changes=max_changes,
+        min_connection=int(min_connection),
+    )
+    elapsed = time.perf_counter() - start
+
+    if legs_df.empty:
+        st.info(f"No journeys found with up to {max_changes} change(s) within 4 days.")
+        return
+
+    options = legs_df["Option"].nunique()
+    st.write(f"### 🚆 {options} Option(s) — fewer changes or earlier arrival ({elapsed * 1000:.0f} ms)")
+    st.caption("Each option arrives earlier than every option with fewer changes.")
+    st.dataframe(legs_df, use_container_width=True, hide_index=True)
+
+    # Connection Scan profile: the best journey for every departure in the next 24 hours
+    if st.checkbox("**Show the best journey for every departure in the next 24 hours**", key=f"{key}_profile"):
+        weekday = DAYS.index(day)
+        journeys = connection_scan.profile(
+            station_search.code(from_station),
+            station_search.code(to_station),
+            weekday,
+            leave_after.hour * 60 + leave_after.minute,
+            min_connection=int(min_connection),
+        )
+        st.dataframe(profile_frame(connection_scan, journeys, weekday), use_container_width=True, hide_index=True)
+
+
+def reachability_ui(planner, station_df, station_code, key="reach"):
+    # Isochrone: everything reachable from station_code within a time budget
+    con = st.container(border=True)
+    con.markdown(f"### 🗺️ Where can I get to from {station_code}?")
+    col1, col2, col3, col4 = con.columns(4)
+    day = col1.selectbox("**Day**", DAYS, index=datetime.date.today().isoweekday() % 7, key=f"{key}_day")
+    leave_after = col2.time_input("**Leave after**", datetime.time(6, 0), step=900, key=f"{key}_time")
+    max_hours = col3.slider("**Within (hours)**", 1, 48, 6, key=f"{key}_hours")
+    max_changes = col4.slider("**Max changes**", 0, 3, 1, key=f"{key}_changes")
+
+    weekday = DAYS.index(day)
+    start = leave_after.hour * 60 + leave_after.minute
+    reach = planner.reachable(station_code, weekday, start, max_hours, max_changes)
+    if reach.empty:
+        con.info(f"No stations reachable from {station_code} within {max_hours} hour(s).")
+        return
+
+    reach_df = reachable_frame(planner, reach, weekday, start)
+    con.write(f"**{len(reach_df)} stations** reachable within {max_hours} hour(s) with up to {max_changes} change(s)")
+    col1, col2 = con.columns([3, 3])
+    with col1:
+        st.dataframe(reach_df.drop(columns=["minutes"]), use_container_width=True, hide_index=True)
+    with col2:
+        isochrone_plot(reach_df, station_df, station_code)
@@ -1,30 +1,35 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
 from support_functions.support_modules import map_plot
+from support_functions import perf
+from support_functions.station_search import PLACEHOLDER
+from search_by_journey import reachability_ui
+from search_by_station import nearby_trains_ui, station_trains
+from support_functions.train_summary import filter_trains
 
-def parse_running_days(running_on: str) -> str:
-    days = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-    return ', '.join(day for day, status in zip(days, running_on) if status == 'Y')
-
-def search_by_station_ui_unreserved(train_df, station_df, build_timetable):
+def search_by_station_ui_unreserved(train_df, station_search, build_timetable, stop_times, train_summary, planner, station_df, station_tree):
     st.subheader("📍 Find Trains Passing Through a Station")
     con1 = st.container(border=True)
 
-    stations_with_none = ["None"] + sorted(
-        station_df["label"].dropna().astype(str).tolist()
-    )
+    # Ranked hits for the typed query instead of the full station catalogue
+    query = con1.text_input("**Select a station**", key="station_query", placeholder=PLACEHOLDER)
+    stations_with_none = ["None"] + station_search.options(query, selected=st.session_state.get("station_select"))
 
-    selected_station = con1.selectbox("**Select a station**", stations_with_none, index=0)
+    selected_station = con1.selectbox(
+        "Select a station", stations_with_none, index=0, key="station_select", label_visibility="collapsed"
+    )
 
     # Filter trains passing through selected station code
+    station_calls = None
     if selected_station == "None":
-        matching_trains_df = train_df.copy()
+        matching_trains_df = train_summary
     else:
-        station_code = selected_station.split(" - ")[0]
-        station_code_cols = [col for col in train_df.columns if col.endswith("_code")]
-        mask = train_df[station_code_cols].apply(lambda row: station_code in row.values, axis=1)
-        matching_trains_df = train_df[mask].copy()
+        station_code = station_search.code(selected_station)
+        matching_trains_df, station_calls = station_trains(train_summary, stop_times, station_code)
+        if con1.checkbox(f"**Show stations reachable from {station_code}**", key="reach_unreserved_show"):
+            reachability_ui(planner, station_df, station_code, key="reach_unreserved")
+    if con1.checkbox("**Show trains from stations near a location**", key="nearby_unreserved_show"):
+        nearby_trains_ui(station_tree, stop_times, train_summary, None if selected_station == "None" else station_code, key="nearby_unreserved")
 
     # Filters Section
     st.write("")
@@ -36,110 +41,45 @@ def search_by_station_ui_unreserved(train_df, station_df, build_timetable):
     day_cols = col1.columns(len(day_options))
     selected_days = [day_options[i] for i, col in enumerate(day_cols) if col.checkbox(day_options[i], key=f"station_day_{i}")]
 
-    # --- Apply Day Filter Logic ---
-    day_idx = {day: i for i, day in enumerate(day_options[:-1])}  # exclude "Daily"
-    if selected_days:
-        if "Daily" in selected_days:
-            matching_trains_df = matching_trains_df[matching_trains_df["runningOn"] == "YYYYYYY"]
-        else:
-            def runs_on_all_selected_days(running_on_str):
-                return all(running_on_str[day_idx[day]] == 'Y' for day in selected_days)
-            matching_trains_df = matching_trains_df[matching_trains_df["runningOn"].apply(runs_on_all_selected_days)]
-
     # --- Class Filter UI ---
     col2.markdown("### 🛏️ Filter by Available Classes")
     static_classes = ["1A", "2A", "3A", "3E", "CC", "SL", "FC", "EV", "VS", "EA", "2S"]
     class_cols = col2.columns(len(static_classes))
     selected_classes = [cls for i, cls in enumerate(static_classes) if class_cols[i].checkbox(cls, key=f"station_class_{cls}")]
 
-    # --- Apply Class Filter Logic ---
-    if selected_classes:
-        def has_any_selected_class(classes_str):
-            train_classes = [cls.strip().upper() for cls in str(classes_str).split(',')]
-            return any(cls in train_classes for cls in selected_classes)
-        matching_trains_df = matching_trains_df[matching_trains_df["journeyClasses"].apply(has_any_selected_class)]
+    # --- Apply Day / Class Filters (bitmask columns of the train summary) ---
+    matching_trains_df = matching_trains_df[
+        filter_trains(matching_trains_df, selected_days, selected_classes, match_all_days=True)
+    ]
 
     if matching_trains_df.empty:
         st.info("No trains found for the selected station and filters.")
         return
 
-    # Build Display Table
-    fmt = "%H:%M"
-    rows = []
-    for _, row in matching_trains_df.iterrows():
-        try:
-            number = str(row["trainNumber"]).replace(",", "")
-            name = str(row["trainName"])
-            stations = [
-                str(row.get(f"station{i}_code", ""))
-                for i in range(1, 100)
-                if pd.notna(row.get(f"station{i}_code"))
-            ]
-            if not stations:
-                continue
-
-            from_code = stations[0]
-            to_code = stations[-1]
-            dep_origin = row.get("station1_dep", "")
-            arr_dest = row.get(f"station{len(stations)}_arr", "")
-            dep_day = int(row.get("station1_day", 0))
-            arr_day = int(row.get(f"station{len(stations)}_day", 0))
-
-            total_duration = "-"
-            total_distance = "-"
-            average_speed = "-"
-
-            try:
-                dep_dt = datetime.strptime(dep_origin, fmt) + timedelta(days=dep_day)
-                arr_dt = datetime.strptime(arr_dest, fmt) + timedelta(days=arr_day)
-                if arr_dt < dep_dt:
-                    arr_dt += timedelta(days=1)
-
-                total_minutes = int((arr_dt - dep_dt).total_seconds() // 60)
-                hrs, mins = divmod(total_minutes, 60)
-                total_duration = f"{hrs}h {mins}m"
-
-                from_dist = row.get("station1_dist")
-                to_dist = row.get(f"station{len(stations)}_dist")
-                if pd.notna(from_dist) and pd.notna(to_dist):
-                    total_distance = int(to_dist - from_dist)
-                    if total_minutes > 0:
-                        average_speed = int(total_distance / (total_minutes / 60))
-            except Exception:
-                pass
-
-            rows.append({
-                "Select": False,
-                "train_df_index": row.name,
-                "Train No": number,
-                "Train Name": name,
-                "Origin": f"{from_code} - {row.get('station1_name', '')}",
-                "Destination": f"{to_code} - {row.get(f'station{len(stations)}_name', '')}",
-                "Departure": dep_origin,
-                "Arrival": arr_dest,
-                "Duration": total_duration,
-                "Distance (km)": int(total_distance),
-                "Avg Speed (km/h)": int(average_speed),
-                "Running On": parse_running_days(row["runningOn"]),
-                "Train Type": row["train_type"],
-                "Classes": row["journeyClasses"],
-            })
-        except Exception:
-            continue
-
-    display_df = pd.DataFrame(rows)
+    # Build Display Table from the precomputed per-train summary
+    display_df = matching_trains_df[[
+        "train_df_index", "Train No", "Train Name", "Origin", "Destination", "Departure", "Arrival",
+        "Duration", "Distance (km)", "Avg Speed (km/h)", "Running On", "Train Type", "Classes",
+    ]].copy()
+    if station_calls is not None:
+        insert_at = display_df.columns.get_loc("Destination") + 1
+        for offset, col in enumerate(station_calls.columns):
+            display_df.insert(insert_at + offset, col, station_calls.loc[display_df.index, col])
+    display_df = display_df.reset_index(drop=True)
+    display_df.insert(0, "Select", False)
     display_df.insert(0, "Sl No", range(1, len(display_df) + 1))
 
     st.subheader("List of trains")
-    edited_df = st.data_editor(
-        display_df.drop(columns=["train_df_index"]),
-        use_container_width=True,
-        hide_index=True,
-        key="station_train_selector",
-        column_config={"Select": st.column_config.CheckboxColumn("Select")},
-        disabled=[col for col in display_df.columns if col not in ["Select", "Sl No"]],
-        num_rows="fixed"
-    )
+    with perf.stage("data_editor", rows=len(display_df)):
+        edited_df = st.data_editor(
+            display_df.drop(columns=["train_df_index"]),
+            use_container_width=True,
+            hide_index=True,
+            key="station_train_selector",
+            column_config={"Select": st.column_config.CheckboxColumn("Select")},
+            disabled=[col for col in display_df.columns if col not in ["Select", "Sl No"]],
+            num_rows="fixed"
+        )
 
     selected_rows = edited_df[edited_df["Select"] == True]
 
@@ -150,7 +90,7 @@ def search_by_station_ui_unreserved(train_df, station_df, build_timetable):
         selected_index = display_df.loc[display_df["Train No"] == selected_train_no, "train_df_index"].values[0]
         selected_train_row = train_df.loc[selected_index]
 
-        df=build_timetable(selected_train_row)
+        df=build_timetable(selected_train_row, stop_times)
         col1, col2 = st.columns([4, 2])
         with col1:
             st.subheader(f"Full Time Table for Train No: {selected_train_row['trainNumber']} - {selected_train_row['trainName']}")
@@ -158,4 +98,4 @@ def search_by_station_ui_unreserved(train_df, station_df, build_timetable):
         with col2:
             st.subheader(f"Route Map (Beta)")
             if st.button("Show Map"):
-                map_plot(df)
+                map_plot(df, selected_train_row["trainNumber"])
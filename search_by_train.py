@@ -1,105 +1,36 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
 from search_by_route import build_timetable
 from support_functions.support_modules import map_plot
+from support_functions import perf
+from support_functions.train_summary import filter_trains
 
 
-def parse_running_days(running_on: str) -> str:
-    days = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-    return ', '.join(day for day, status in zip(days, running_on) if status == 'Y')
-
-
-def find_matching_trains_by_name(train_df, query, running_days_filter=None, classes_filter=None):
-    matches = []
-    fmt = "%H:%M"
-    query = query.lower()
-
-    for _, row in train_df.iterrows():
-        number = str(row["trainNumber"]).replace(",", "")
-        name = str(row["trainName"])
-
-        if query in number.lower() or query in name.lower():
-            stations = [
-                str(row.get(f"station{i}_code", ""))
-                for i in range(1, 100)
-                if pd.notna(row.get(f"station{i}_code"))
-            ]
-            if not stations:
-                continue
-
-            running_on_flags = row["runningOn"]
-            train_days = [day for day, flag in zip(['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat'], running_on_flags) if flag == "Y"]
-
-            if running_days_filter == "Daily":
-                if not all(flag == "Y" for flag in running_on_flags):
-                    continue
-            elif isinstance(running_days_filter, list) and running_days_filter:
-                if not any(day in train_days for day in running_days_filter):
-                    continue
-
-            train_classes = [cls.strip() for cls in str(row.get("journeyClasses", "")).split(',')]
-            if classes_filter:
-                if not any(cls in train_classes for cls in classes_filter):
-                    continue
-
-            from_code = stations[0]
-            to_code = stations[-1]
-            dep_origin = row.get("station1_dep", "")
-            arr_dest = row.get(f"station{len(stations)}_arr", "")
-            dep_day = int(row.get("station1_day", 0))
-            arr_day = int(row.get(f"station{len(stations)}_day", 0))
-
-            total_duration = "-"
-            total_distance = "-"
-            average_speed = "-"
-
-            try:
-                dep_dt = datetime.strptime(dep_origin, fmt) + timedelta(days=dep_day)
-                arr_dt = datetime.strptime(arr_dest, fmt) + timedelta(days=arr_day)
-                if arr_dt < dep_dt:
-                    arr_dt += timedelta(days=1)
-
-                total_minutes = int((arr_dt - dep_dt).total_seconds() // 60)
-                hrs, mins = divmod(total_minutes, 60)
-                total_duration = f"{hrs}h {mins}m"
-
-                from_dist = row.get("station1_dist")
-                to_dist = row.get(f"station{len(stations)}_dist")
-                if pd.notna(from_dist) and pd.notna(to_dist):
-                    total_distance = int(to_dist - from_dist)
-                    if total_minutes > 0:
-                        average_speed = int(total_distance / (total_minutes / 60))
-            except Exception:
-                pass
-
-            matches.append({
-                "Train No": number,
-                "Train Name": name,
-                "Origin": f"{from_code} - {row.get('station1_name', '')}",
-                "Destination": f"{to_code} - {row.get(f'station{len(stations)}_name', '')}",
-                "Running On": parse_running_days(row["runningOn"]),
-                "Train Type": row["train_type"],
-                "Classes": row["journeyClasses"],
-                "Departure": dep_origin,
-                "Arrival": arr_dest,
-                "Duration": total_duration,
-                "Distance (km)": total_distance if isinstance(total_distance, int) else "-",
-                "Avg Speed (km/h)": average_speed if isinstance(average_speed, int) else "-",
-
-                "Index": row.name
-            })
-
-    return pd.DataFrame(matches)
-
-
-def search_by_train(train_df):
+@perf.timed("find_matching_trains_by_name")
+def find_matching_trains_by_name(train_summary, search_index, query, running_days_filter=None, classes_filter=None):
+    # Day/class bitmask filters first, then the trigram index over number and name
+    running_days = ["Daily"] if running_days_filter == "Daily" else running_days_filter
+    candidates = np.flatnonzero(filter_trains(train_summary, running_days, classes_filter))
+    if query:
+        candidates, _ = search_index.search(query, candidates)
+    matches = train_summary.iloc[candidates]
+
+    columns = [
+        "Train No", "Train Name", "Origin", "Destination", "Running On", "Train Type", "Classes",
+        "Departure", "Arrival", "Duration", "Distance (km)", "Avg Speed (km/h)", "train_df_index",
+    ]
+    return matches[columns].rename(columns={"train_df_index": "Index"}).reset_index(drop=True)
+
+
+def search_by_train(train_df, stop_times, train_summary, search_index):
     st.subheader("🔍 Search by Train Number or Name")
 
     con1 = st.container(border=True)
-    train_df["label"] = train_df["trainNumber"].astype(str) + " - " + train_df["trainName"]
-    train_labels = sorted(train_df["label"].tolist())
-    label_to_number = dict(zip(train_df["label"], train_df["trainNumber"].astype(str)))
+    with perf.stage("train_labels", rows=len(train_df)):
+        train_df["label"] = train_df["trainNumber"].astype(str) + " - " + train_df["trainName"]
+        train_labels = sorted(train_df["label"].tolist())
+        label_to_number = dict(zip(train_df["label"], train_df["trainNumber"].astype(str)))
 
     def on_selectbox_change():
         st.session_state["textinput_train"] = ""
@@ -151,7 +82,8 @@ def search_by_train(train_df):
 
     # Find results based on query and filters (even if query is empty)
     results_df = find_matching_trains_by_name(
-        train_df,
+        train_summary,
+        search_index,
         query if query else "",
         running_days_filter,
         classes_filter
@@ -162,7 +94,7 @@ def search_by_train(train_df):
         selected_row = train_df[train_df["trainNumber"].astype(str) == selected_train_number]
         if not selected_row.empty:
             row = selected_row.iloc[0]
-            df = build_timetable(row)
+            df = build_timetable(row, stop_times)
             col1, col2 = st.columns([4, 2])
             with col1:
                 st.subheader(f"Full Time Table for Train No: {row['trainNumber']} - {row['trainName']}")
@@ -170,7 +102,7 @@ def search_by_train(train_df):
             with col2:
                 st.subheader("Route Map (Beta)")
                 if st.button("Show Map"):
-                    map_plot(df)
+                    map_plot(df, row["trainNumber"])
         st.markdown("---")
 
     elif results_df.empty:
@@ -182,15 +114,16 @@ def search_by_train(train_df):
         display_df["Select"] = False
         display_df = display_df[["Select"] + [col for col in display_df.columns if col != "Select"]]
 
-        edited_df = st.data_editor(
-            display_df,
-            use_container_width=True,
-            hide_index=True,
-            key="search_table_editor",
-            column_config={"Select": st.column_config.CheckboxColumn("Select")},
-            disabled=[col for col in display_df.columns if col != "Select"],
-            num_rows="fixed"
-        )
+        with perf.stage("data_editor", rows=len(display_df)):
+            edited_df = st.data_editor(
+                display_df,
+                use_container_width=True,
+                hide_index=True,
+                key="search_table_editor",
+                column_config={"Select": st.column_config.CheckboxColumn("Select")},
+                disabled=[col for col in display_df.columns if col != "Select"],
+                num_rows="fixed"
+            )
 
         selected_rows = edited_df[edited_df["Select"] == True]
 
@@ -200,7 +133,7 @@ def search_by_train(train_df):
             selected_train_no = selected_rows.iloc[0]["Train No"]
             original_index = results_df[results_df["Train No"] == selected_train_no]["Index"].values[0]
             row = train_df.loc[original_index]
-            df = build_timetable(row)
+            df = build_timetable(row, stop_times)
             col1, col2 = st.columns([4, 2])
             with col1:
                 st.subheader(f"Full Time Table for Train No: {row['trainNumber']} - {row['trainName']}")
@@ -208,4 +141,4 @@ def search_by_train(train_df):
             with col2:
                 st.subheader("Route Map (Beta)")
                 if st.button("Show Map"):
-                    map_plot(df)
+                    map_plot(df, row["trainNumber"])
@@ -0,0 +1,228 @@
+"""Headless batch of Trains Between Stations queries.
+
+Reads station pairs from CSV or JSONL with columns `from`, `to` and optional
+`days` ("Mon,Wed" / "Daily") and `classes` ("3A,SL"); lists are accepted in
+JSONL. Each pair runs the same search as the route pages (find_matching_trains)
+and every matching train becomes one output row, streamed to JSONL or Parquet
+as the chunks finish.
+
+The schedule is loaded once in the parent before the process pool starts, so
+forked workers share its arrays copy-on-write; where fork is not available
+each worker loads it from the snapshot instead. Pairs are sent to the pool in
+chunks, keeping a bounded number in flight.
+
+    python -m support_functions.batch_routes run pairs.csv --out trains.parquet
+    python -m support_functions.batch_routes scaling pairs.csv
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from search_by_route import direct_train_stops, trips_frame
+from support_functions.snapshot import read_schedule
+from support_functions.train_summary import build_train_summary, filter_trains
+
+
+CHUNK_PAIRS = 256
+IN_FLIGHT_PER_WORKER = 4
+NUMERIC_COLUMNS = ["Distance (km)", "Avg Speed (km/h)"]
+
+# (train_summary, stop_times) of the worker's process; set before forking
+_schedule = None
+
+
+def load_schedule(database_dir: str, schedule: str = "reserved_train_schedule.csv"):
+    train_df, stop_times = read_schedule(os.path.join(database_dir, schedule))
+    return build_train_summary(train_df, stop_times), stop_times
+
+
+def _init_worker(database_dir: str, schedule: str):
+    global _schedule
+    if _schedule is None:
+        _schedule = load_schedule(database_dir, schedule)
+
+
+def _as_list(value) -> list:
+    """"Mon, Tue" / ["Mon", "Tue"] / NaN -> ["Mon", "Tue"] / []."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    return [v.strip() for v in str(value).replace(";", ",").split(",") if v.strip()]
+
+
+def read_pairs(path: str, chunk_pairs: int = CHUNK_PAIRS):
+    """Yield DataFrames of up to chunk_pairs rows: pair, from, to, days, classes."""
+    if path.endswith((".jsonl", ".json")):
+        reader = pd.read_json(path, lines=True, chunksize=chunk_pairs, dtype=False)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_pairs, dtype=str, keep_default_na=False)
+    start = 0
+    for chunk in reader:
+        missing = {"from", "to"} - set(chunk.columns)
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+        yield pd.DataFrame({
+            "pair": np.arange(start, start + len(chunk)),
+            "from": chunk["from"].astype(str).str.strip().str.upper().to_numpy(),
+            "to": chunk["to"].astype(str).str.strip().str.upper().to_numpy(),
+            "days": chunk["days"].map(_as_list).to_numpy() if "days" in chunk else [[]] * len(chunk),
+            "classes": chunk["classes"].map(_as_list).to_numpy() if "classes" in chunk else [[]] * len(chunk),
+        })
+        start += len(chunk)
+
+
+def query_chunk(pairs: pd.DataFrame) -> tuple:
+    """Run every pair in the chunk; returns (n_pairs, result rows).
+
+    Pairs are resolved to stop indices one by one, then all of the chunk's
+    trips are formatted in a single trips_frame call.
+    """
+    train_summary, stop_times = _schedule
+    filters = {}
+    pair_ids, from_parts, to_parts, train_parts = [], [], [], []
+    for pair, from_code, to_code, days, classes in pairs.itertuples(index=False):
+        if from_code == to_code:
+            continue
+        from_stops, to_stops, trains = direct_train_stops(train_summary, from_code, to_code, stop_times)
+        if days or classes:
+            key = (tuple(days), tuple(classes))
+            if key not in filters:
+                allowed = np.zeros(stop_times.n_trains, dtype=bool)
+                allowed[train_summary.index[filter_trains(train_summary, days, classes)]] = True
+                filters[key] = allowed
+            keep = filters[key][trains]
+            from_stops, to_stops, trains = from_stops[keep], to_stops[keep], trains[keep]
+        pair_ids.append(np.full(len(trains), pair))
+        from_parts.append(from_stops)
+        to_parts.append(to_stops)
+        train_parts.append(trains)
+    if not train_parts or not sum(map(len, train_parts)):
+        return len(pairs), None
+
+    from_stops, to_stops = np.concatenate(from_parts), np.concatenate(to_parts)
+    rows = trips_frame(train_summary, stop_times, from_stops, to_stops, np.concatenate(train_parts))
+    for column in NUMERIC_COLUMNS:
+        rows[column] = pd.to_numeric(rows[column], errors="coerce").astype("Int32")
+    codes = stop_times.station_codes
+    rows.insert(0, "To", codes[stop_times.station_id[to_stops]])
+    rows.insert(0, "From", codes[stop_times.station_id[from_stops]])
+    rows.insert(0, "Pair", np.concatenate(pair_ids))
+    return len(pairs), rows
+
+
+class _Writer:
+    """Appends result frames to a JSONL ("-" for stdout) or Parquet file."""
+
+    def __init__(self, out: str):
+        self.out = out
+        self.parquet = out.endswith(".parquet")
+        self._file = None
+        self._writer = None
+        if not self.parquet:
+            self._file = sys.stdout if out == "-" else open(out, "w")
+
+    def write(self, rows: pd.DataFrame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(rows, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.out, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            rows.to_json(self._file, orient="records", lines=True, force_ascii=False)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None and self._file is not sys.stdout:
+            self._file.close()
+
+
+def _executor(workers: int, database_dir: str, schedule: str) -> ProcessPoolExecutor:
+    if "fork" in multiprocessing.get_all_start_methods():
+        _init_worker(database_dir, schedule)
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(database_dir, schedule))
+
+
+def run(pairs_path: str, out: str, database_dir: str, schedule: str = "reserved_train_schedule.csv",
+        workers: int = None, chunk_pairs: int = CHUNK_PAIRS) -> dict:
+    """Query every pair in pairs_path and write the trains to out; returns throughput stats."""
+    workers = workers or os.cpu_count() or 1
+    writer = _Writer(out)
+    n_pairs = n_rows = 0
+
+    def collect(future):
+        nonlocal n_pairs, n_rows
+        done_pairs, rows = future.result()
+        n_pairs += done_pairs
+        if rows is not None:
+            writer.write(rows)
+            n_rows += len(rows)
+
+    start = time.perf_counter()
+    try:
+        with _executor(workers, database_dir, schedule) as pool:
+            start = time.perf_counter()
+            pending = deque()
+            # Results are written in input order while later chunks keep running
+            for chunk in read_pairs(pairs_path, chunk_pairs):
+                pending.append(pool.submit(query_chunk, chunk))
+                while len(pending) >= workers * IN_FLIGHT_PER_WORKER or (pending and pending[0].done()):
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "pairs": n_pairs,
+        "rows": n_rows,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "pairs_per_second": round(n_pairs / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def scaling(pairs_path: str, database_dir: str, schedule: str = "reserved_train_schedule.csv",
+            max_workers: int = None) -> pd.DataFrame:
+    """Throughput at 1, 2, 4, ... workers up to max_workers, discarding the output."""
+    max_workers = max_workers or os.cpu_count() or 1
+    counts = sorted({min(1 << i, max_workers) for i in range(max_workers.bit_length() + 1)})
+    rows = []
+    for workers in counts:
+        stats = run(pairs_path, os.devnull, database_dir, schedule, workers)
+        rows.append(stats)
+    result = pd.DataFrame(rows)
+    result["speedup"] = result["pairs_per_second"] / result["pairs_per_second"].iloc[0]
+    result["efficiency"] = result["speedup"] / result["workers"]
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "scaling"])
+    parser.add_argument("pairs", help="CSV or JSONL file of station pairs")
+    parser.add_argument("--out", default="-", help="JSONL path, .parquet path, or - for stdout")
+    parser.add_argument("--database", default=os.path.join(os.getcwd(), "database"))
+    parser.add_argument("--schedule", default="reserved_train_schedule.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=CHUNK_PAIRS, help="pairs per task")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        stats = run(args.pairs, args.out, args.database, args.schedule, args.workers, args.chunk)
+        print(json.dumps(stats), file=sys.stderr)
+    else:
+        print(scaling(args.pairs, args.database, args.schedule, args.workers).to_string(index=False, float_format="%.2f"))
@@ -0,0 +1,426 @@
+"""Headless benchmarks of the query paths behind the pages.
+
+Each case calls the same functions a page does, without Streamlit rendering,
+over a fixed seeded sample of inputs: latency percentiles come from timing
+every call, peak memory from a separate pass under tracemalloc. Cases run on
+a bundled schedule (train_schedule_1.csv unless --schedule names another
+CSV in database/) and on schedules scaled 10x and 100x: by default
+every train repeated under new numbers, or with --source synthetic a
+generated schedule of that size (support_functions.synthetic, seeded).
+
+Results are written as JSON; compare() matches them against a stored
+baseline per (scale, case) and flags p50/p90 regressions beyond a tolerance.
+
+    python -m support_functions.benchmark run --out bench.json
+    python -m support_functions.benchmark run --scales 1 10 --baseline bench_baseline.json
+    python -m support_functions.benchmark run --schedule all_train_schedule.csv --cases build_timetable
+    python -m support_functions.benchmark compare bench.json bench_baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+import pandas as pd
+import streamlit  # noqa: F401  (sets up the streamlit loggers silenced below)
+
+from support_functions.snapshot import read_schedule, read_table
+from support_functions.stop_times import StopTimes, timetable_frame
+from support_functions.dashboard import build_dashboard
+from support_functions.master_list import range_mask, typed_master_list
+from support_functions.spatial_index import StationKDTree, nearby_trains
+from support_functions.text_index import TrigramIndex
+from support_functions.train_summary import DAYS, build_train_summary, filter_trains
+
+# The page modules decorate functions with st.cache_data, which warns once per
+# function when there is no Streamlit runtime
+logging.getLogger("streamlit.runtime.caching.cache_data_api").setLevel(logging.ERROR)
+
+from search_by_route import find_matching_trains  # noqa: E402
+from search_by_station import station_trains  # noqa: E402
+from search_by_train import find_matching_trains_by_name  # noqa: E402
+from support_functions.support_modules import (  # noqa: E402
+    SIMPLIFY_TOLERANCE_KM, CoordIndex, jump_filter, simplify_route
+)
+
+
+SCALES = [1, 10, 100]
+QUERIES = 200
+HEAVY_QUERIES = 10
+WARMUP = 3
+MEMORY_CALLS = 5
+PERCENTILES = [50, 90, 99]
+FILTER_CLASSES = ["1A", "2A", "3A", "SL", "CC", "2S"]
+# A schedule that ships in database/; point --schedule at another one to benchmark it
+DEFAULT_SCHEDULE = "train_schedule_1.csv"
+
+
+def load_dataset(database_dir: str, schedule: str = DEFAULT_SCHEDULE) -> dict:
+    """The frames and indices load_data builds for one schedule's pages."""
+    train_df, stop_times = read_schedule(os.path.join(database_dir, schedule))
+    station_df = read_table(os.path.join(database_dir, "station_index_with_coords.csv"))
+    station_df = station_df.drop_duplicates(subset="stationCode", keep="first")
+    station_df["stationCode"] = station_df["stationCode"].str.upper()
+    return {
+        "master_train_df": read_table(os.path.join(database_dir, "master_list.csv")),
+        "station_df": station_df,
+        # map_plot reads the coordinates CSV as is
+        "coord_df": pd.read_csv(os.path.join(database_dir, "station_index_with_coords.csv")),
+        "stop_times": stop_times,
+        "train_summary": build_train_summary(train_df, stop_times),
+    }
+
+
+def scale_stop_times(stop_times: StopTimes, factor: int) -> StopTimes:
+    """stop_times with every train repeated factor times; copy k is numbered "<number>/<k>"."""
+    n = stop_times.n_trains
+    numbers = [stop_times.train_numbers] + [
+        np.array([f"{number}/{k}" for number in stop_times.train_numbers], dtype=object) for k in range(1, factor)
+    ]
+    lengths = np.tile(np.diff(stop_times.offsets), factor)
+    offsets = np.zeros(n * factor + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return StopTimes(
+        train_numbers=np.concatenate(numbers),
+        train_index=np.arange(n * factor),
+        offsets=offsets,
+        station_codes=stop_times.station_codes,
+        station_id=np.tile(stop_times.station_id, factor),
+        stop_name=np.tile(stop_times.stop_name, factor),
+        arr=np.tile(stop_times.arr, factor),
+        dep=np.tile(stop_times.dep, factor),
+        day=np.tile(stop_times.day, factor),
+        dist=np.tile(stop_times.dist, factor),
+        arr_text=np.tile(stop_times.arr_text, factor),
+        dep_text=np.tile(stop_times.dep_text, factor),
+    )
+
+
+def scale_dataset(data: dict, factor: int, source: str = "tiled", database_dir: str = None, seed: int = 0,
+                  schedule: str = DEFAULT_SCHEDULE) -> dict:
+    """data with factor times as many trains.
+
+    source "tiled" repeats the bundled schedule; "synthetic" generates a fresh
+    one of the same total size from support_functions.synthetic (also at x1).
+    The master list and coordinate table are repeated either way.
+    """
+    if factor == 1 and source == "tiled":
+        return data
+    n = data["stop_times"].n_trains
+    if source == "synthetic":
+        from support_functions.synthetic import StationPool, header_sampler, synthetic_stop_times
+
+        pool = StationPool(os.path.join(database_dir, "station_index_with_coords.csv"))
+        headers = header_sampler(os.path.join(database_dir, schedule))
+        trains, stop_times = synthetic_stop_times(pool, headers, n * factor, seed)
+        train_summary = build_train_summary(trains, stop_times)
+    else:
+        stop_times = scale_stop_times(data["stop_times"], factor)
+        copies = []
+        for k in range(factor):
+            summary = data["train_summary"].copy()
+            summary.index = summary.index + k * n
+            summary["train_df_index"] = summary.index
+            if k:
+                summary["Train No"] = summary["Train No"] + f"/{k}"
+            copies.append(summary)
+        train_summary = pd.concat(copies)
+        train_summary.index.name = "train"
+
+    master = data["master_train_df"]
+    master_copies = [master.assign(**{"Train No": master["Train No"].astype(str) + (f"/{k}" if k else "")})
+                     for k in range(factor)]
+    coords = data["coord_df"]
+    coord_copies = [coords.assign(stationName=coords["stationName"].astype(str) + (f" {k}" if k else ""))
+                    for k in range(factor)]
+    return {
+        "master_train_df": pd.concat(master_copies, ignore_index=True),
+        "station_df": data["station_df"],
+        "coord_df": pd.concat(coord_copies, ignore_index=True),
+        "stop_times": stop_times,
+        "train_summary": train_summary,
+    }
+
+
+def _random_filters(rng):
+    days = list(rng.choice(DAYS, rng.integers(0, 3), replace=False)) if rng.random() < 0.5 else None
+    classes = list(rng.choice(FILTER_CLASSES, rng.integers(1, 3), replace=False)) if rng.random() < 0.5 else None
+    return days, classes
+
+
+def _trains(data: dict) -> np.ndarray:
+    return data["train_summary"].index.to_numpy()
+
+
+def _route_names(data: dict, rng) -> list:
+    """Stop names of random trains, in route order, as map_plot gets them."""
+    stop_times = data["stop_times"]
+    return [pd.unique(stop_times.stop_name[stop_times.stops(train)]).tolist()
+            for train in rng.choice(_trains(data), HEAVY_QUERIES * 2)]
+
+
+def _route_case(data: dict, rng):
+    stop_times, train_summary = data["stop_times"], data["train_summary"]
+    codes = stop_times.station_codes
+    pairs = []
+    for train in rng.choice(_trains(data), QUERIES):
+        stops = np.arange(stop_times.offsets[train], stop_times.offsets[train + 1])
+        a, b = np.sort(rng.choice(stops, 2, replace=False))
+        pairs.append((codes[stop_times.station_id[a]], codes[stop_times.station_id[b]], *_random_filters(rng)))
+
+    def route(from_code, to_code, days, classes):
+        return find_matching_trains(train_summary, from_code, to_code, stop_times, days, classes)
+    return route, pairs
+
+
+def _by_name_case(data: dict, rng):
+    train_summary = data["train_summary"]
+    search_index = TrigramIndex(train_summary["Train No"], train_summary["Train Name"])
+    names = train_summary["Train Name"].to_numpy()
+    name_queries = []
+    for train in rng.choice(len(names), QUERIES):
+        name = str(names[train])
+        start = rng.integers(0, max(1, len(name) - 3))
+        name_queries.append((name[start:start + rng.integers(3, 7)],))
+
+    def by_name(query):
+        return find_matching_trains_by_name(train_summary, search_index, query)
+    return by_name, name_queries
+
+
+def _timetable_case(data: dict, rng):
+    stop_times = data["stop_times"]
+
+    def timetable(train):
+        # build_timetable's work on a cache miss
+        return timetable_frame(stop_times, train)
+    return timetable, [(int(t),) for t in rng.choice(_trains(data), QUERIES)]
+
+
+def _station_case(data: dict, rng):
+    stop_times, train_summary = data["stop_times"], data["train_summary"]
+    served = np.flatnonzero(np.diff(stop_times.posting_offsets) > 0)
+    stations = [(stop_times.station_codes[sid], *_random_filters(rng)) for sid in rng.choice(served, QUERIES)]
+
+    def station_mask(code, days, classes):
+        matching_trains_df, _ = station_trains(train_summary, stop_times, code)
+        return matching_trains_df[filter_trains(matching_trains_df, days, classes, match_all_days=True)]
+    return station_mask, stations
+
+
+def _geocode_case(data: dict, rng):
+    # Built once per process in the app (coord_index), so only lookups are timed
+    coords = CoordIndex(data["coord_df"])
+
+    def geocode_lookup(route_stations):
+        # map_plot's per-call coordinate lookup
+        return [coords.get(name=name) for name in route_stations]
+    return geocode_lookup, [(names,) for names in _route_names(data, rng)]
+
+
+def _route_geometry_case(data: dict, rng):
+    coords = CoordIndex(data["coord_df"])
+    route_points = []
+    for names in _route_names(data, rng):
+        points = [coords.get(name=name) for name in names]
+        points = np.array([p for p in points if p is not None], dtype=float).reshape(-1, 2)
+        route_points.append((points[:, 0], points[:, 1]))
+
+    def route_geometry(lat, lon):
+        # route_geometry's work on a cache miss: the jump filter and line simplification
+        keep = jump_filter(lat, lon)
+        return simplify_route(lat[keep], lon[keep], SIMPLIFY_TOLERANCE_KM)
+    return route_geometry, route_points
+
+
+def _nearby_case(data: dict, rng):
+    # Near a random station with coordinates, as the nearby search's default would be
+    station_tree = StationKDTree.from_station_df(data["station_df"])
+    near = rng.choice(len(station_tree), QUERIES)
+    locations = [(station_tree.lat[i] + rng.normal(0, 0.05), station_tree.lon[i] + rng.normal(0, 0.05)) for i in near]
+
+    def nearby(lat, lon):
+        return nearby_trains(station_tree, data["stop_times"], data["train_summary"], lat, lon, 10)
+    return nearby, locations
+
+
+def _home_aggregations_case(data: dict, rng):
+    # Built once per dataset version in load_data; a rerun only turns its tables into frames
+    dashboard = build_dashboard(data["master_train_df"], data["station_df"])
+
+    def home_aggregations():
+        return [(view.metrics, view.by_type.frame("Train Type"), view.by_zone.frame("Zone"))
+                for view in dashboard.views.values()]
+    return home_aggregations, [()] * HEAVY_QUERIES
+
+
+def _build_dashboard_case(data: dict, rng):
+    def dashboard_build():
+        return build_dashboard(data["master_train_df"], data["station_df"])
+    return dashboard_build, [()] * HEAVY_QUERIES
+
+
+def _typed_master_list_case(data: dict, rng):
+    def master_list_ingest():
+        return typed_master_list(data["master_train_df"])
+    return master_list_ingest, [()] * HEAVY_QUERIES
+
+
+def _home_range_filter_case(data: dict, rng):
+    typed_master = typed_master_list(data["master_train_df"])
+    # Home range filters: at least some km, km/h and a duration cap in minutes
+    range_queries = [({
+        "distance_km": (int(rng.integers(0, 2000)), None),
+        "speed_kmh": (int(rng.integers(0, 90)), None),
+        "duration_min": (None, int(rng.integers(60, 3000))),
+    },) for _ in range(QUERIES)]
+
+    def home_range_filter(ranges):
+        return typed_master[range_mask(typed_master, ranges)]
+    return home_range_filter, range_queries
+
+
+# case name -> builder(data, rng) returning (function, list of argument tuples)
+CASES = {
+    "find_matching_trains": _route_case,
+    "find_matching_trains_by_name": _by_name_case,
+    "build_timetable": _timetable_case,
+    "station_mask": _station_case,
+    "map_plot_geocode_lookup": _geocode_case,
+    "map_route_geometry": _route_geometry_case,
+    "nearby_trains": _nearby_case,
+    "home_aggregations": _home_aggregations_case,
+    "build_dashboard": _build_dashboard_case,
+    "typed_master_list": _typed_master_list_case,
+    "home_range_filter": _home_range_filter_case,
+}
+
+
+def build_cases(data: dict, seed: int = 0, cases=None) -> dict:
+    """case name -> (function, list of argument tuples), for the selected cases only.
+
+    Each case draws its sample from its own generator seeded by (seed, case
+    name), so a case gets the same inputs whichever other cases run.
+    """
+    unknown = set(cases or []) - set(CASES)
+    if unknown:
+        raise ValueError(f"unknown cases {sorted(unknown)}; choose from {list(CASES)}")
+    return {
+        name: build(data, np.random.default_rng([seed, zlib.crc32(name.encode())]))
+        for name, build in CASES.items() if not cases or name in cases
+    }
+
+
+def measure(function, calls: list) -> dict:
+    for args in calls[:WARMUP]:
+        function(*args)
+    latencies = np.empty(len(calls))
+    for i, args in enumerate(calls):
+        start = time.perf_counter()
+        function(*args)
+        latencies[i] = time.perf_counter() - start
+    latencies *= 1000
+
+    tracemalloc.start()
+    try:
+        for args in calls[:MEMORY_CALLS]:
+            function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {"calls": len(calls), "mean_ms": float(latencies.mean())}
+    result.update({f"p{p}_ms": float(v) for p, v in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))})
+    result["max_ms"] = float(latencies.max())
+    result["peak_kib"] = peak / 1024
+    return result
+
+
+def run(database_dir: str, scales=SCALES, seed: int = 0, cases=None, source: str = "tiled",
+        schedule: str = DEFAULT_SCHEDULE) -> dict:
+    """Benchmark the cases (default: all) at every scale; returns the JSON-ready report."""
+    base = load_dataset(database_dir, schedule)
+    results = []
+    for factor in scales:
+        data = scale_dataset(base, factor, source, database_dir, seed, schedule)
+        for name, (function, calls) in build_cases(data, seed, cases).items():
+            row = {"scale": factor, "case": name, **measure(function, calls)}
+            results.append(row)
+            print(f"x{factor:<4} {name:<30} p50 {row['p50_ms']:9.3f} ms  p99 {row['p99_ms']:9.3f} ms"
+                  f"  peak {row['peak_kib']:10.0f} KiB", file=sys.stderr)
+        del data
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seed": seed,
+            "source": source,
+            "schedule": schedule,
+            "trains": base["stop_times"].n_trains,
+            "stops": base["stop_times"].n_stops,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.25) -> pd.DataFrame:
+    """p50 / p90 / peak ratios against baseline; regressed when a latency ratio exceeds 1 + tolerance."""
+    current = pd.DataFrame(report["results"]).set_index(["scale", "case"])
+    previous = pd.DataFrame(baseline["results"]).set_index(["scale", "case"])
+    both = current.join(previous, how="inner", rsuffix="_baseline")
+    table = pd.DataFrame({
+        "p50_ms": both["p50_ms"],
+        "p50_ratio": both["p50_ms"] / both["p50_ms_baseline"],
+        "p90_ratio": both["p90_ms"] / both["p90_ms_baseline"],
+        "peak_ratio": both["peak_kib"] / both["peak_kib_baseline"],
+    })
+    table["regressed"] = (table["p50_ratio"] > 1 + tolerance) | (table["p90_ratio"] > 1 + tolerance)
+    return table.reset_index()
+
+
+def _read_json(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("files", nargs="*", help="compare: REPORT BASELINE")
+    parser.add_argument("--database", default=os.path.join(os.getcwd(), "database"))
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--schedule", default=DEFAULT_SCHEDULE, help="schedule CSV in --database")
+    parser.add_argument("--cases", nargs="+", default=None, choices=list(CASES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--source", choices=["tiled", "synthetic"], default="tiled",
+                        help="how the scaled schedules are made")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--baseline", default=None, help="run: compare the new report against this file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.database, args.scales, args.seed, args.cases, args.source, args.schedule)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}", file=sys.stderr)
+        baseline = _read_json(args.baseline) if args.baseline else None
+    else:
+        if len(args.files) != 2:
+            parser.error("compare needs REPORT and BASELINE")
+        report, baseline = map(_read_json, args.files)
+
+    if baseline is not None:
+        table = compare(report, baseline, args.tolerance)
+        print(table.to_string(index=False, float_format="%.2f"))
+        sys.exit(1 if table["regressed"].any() else 0)
@@ -0,0 +1,296 @@
+"""Connection Scan (CSA) earliest-arrival and profile queries.
+
+Every hop between consecutive stops of a train run is one connection. Runs are
+laid out over a repeating week: connections of the runs leaving their origin in
+the previous, current and next week are kept when they depart within two weeks
+of Sunday 00:00, and all of them are sorted by departure into flat arrays.
+
+A query walks that array from the requested departure. The scan is done a time
+slice at a time: within a slice the connections are relaxed together and the
+slice is repeated until nothing improves, which reproduces the sequential scan
+(connections only ever feed later ones) with numpy doing the inner loop.
+
+Per-query state (arrival per station, entry connection per trip) lives in
+buffers that are allocated once per thread and reset with fill().
+
+check() cross-checks JourneyPlanner against it on a bundled schedule: every
+leg must arrive no earlier than it leaves, and RAPTOR's earliest arrivals with
+enough changes must equal the scan's.
+
+    python -m support_functions.connection_scan check --origins 150
+"""
+import argparse
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from support_functions.journey_planner import Journey, JourneyPlanner, Leg, format_time, summary_train_arrays
+from support_functions.stop_times import StopTimes, format_duration, hop_chains, origin_day_offsets, valid_hops
+from support_functions.train_summary import DAYS
+
+
+MINUTES_PER_DAY = 1440
+WEEK = 7 * MINUTES_PER_DAY
+UNREACHED = 1 << 40
+NO_TRIP = np.iinfo(np.int32).max
+SLICE_MINUTES = 30
+
+
+class ConnectionScan:
+    """Departure-sorted connection arrays over one schedule.
+
+    days_masks holds each train's running-day mask (bit i = DAYS[i]) by
+    StopTimes train id. Query times are minutes from midnight of `weekday`.
+    """
+
+    def __init__(self, stop_times: StopTimes, days_masks: np.ndarray, train_names=None):
+        self.stop_times = stop_times
+        self.train_names = np.full(stop_times.n_trains, "", dtype=object) if train_names is None else train_names
+        dep_offset, arr_offset, can_board, can_alight = origin_day_offsets(stop_times)
+
+        # Hops: stop i -> i + 1 of the same train, both times known, not backwards
+        hop = valid_hops(stop_times, dep_offset, arr_offset, can_board, can_alight)
+        chain = hop_chains(stop_times.n_stops, hop)
+        hop_train = stop_times.stop_train[hop]
+
+        # Runs: (train, origin day) for every running day of weeks -1, 0 and 1
+        days_masks = np.asarray(days_masks, dtype=np.int64)
+        run_train, run_day = np.nonzero(
+            (days_masks[:, None] >> np.arange(len(DAYS))) & 1
+        )
+        run_train = np.repeat(run_train, 3)
+        run_start = (np.repeat(run_day, 3) + np.tile([-7, 0, 7], len(run_day))) * MINUTES_PER_DAY
+
+        # Expand runs x hops of their train, via the hops' CSR layout by train
+        hop_offsets = np.searchsorted(hop_train, np.arange(stop_times.n_trains + 1))
+        counts = hop_offsets[run_train + 1] - hop_offsets[run_train]
+        conn_run = np.repeat(np.arange(len(run_train), dtype=np.int32), counts)
+        conn_hop = hop[
+            np.repeat(hop_offsets[run_train], counts)
+            + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        ]
+        dep_time = run_start[conn_run] + dep_offset[conn_hop]
+        keep = (dep_time >= 0) & (dep_time < 2 * WEEK)
+
+        order = np.argsort(dep_time[keep], kind="stable")
+        self.conn_stop = conn_hop[keep][order].astype(np.int32)       # departure stop; arrival is +1
+        # A trip is one run along one hop chain, so it is never ridden across a broken hop
+        n_chains = int(chain[-1]) + 1 if len(chain) else 1
+        trip_key = conn_run[keep][order].astype(np.int64) * n_chains + chain[self.conn_stop]
+        trips, conn_trip = np.unique(trip_key, return_inverse=True)
+        self.conn_trip = conn_trip.astype(np.int32)
+        self.dep_time = dep_time[keep][order].astype(np.int32)
+        self.arr_time = (self.dep_time + (arr_offset[self.conn_stop + 1] - dep_offset[self.conn_stop])).astype(np.int32)
+        self.dep_station = stop_times.station_id[self.conn_stop]
+        self.arr_station = stop_times.station_id[self.conn_stop + 1]
+        self.n_trips = len(trips)
+        self.slice_starts = np.searchsorted(self.dep_time, np.arange(0, 2 * WEEK + SLICE_MINUTES, SLICE_MINUTES))
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # st.cache_data pickles its results; the per-thread buffers are rebuilt lazily
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @classmethod
+    def from_summary(cls, stop_times: StopTimes, train_summary: pd.DataFrame) -> "ConnectionScan":
+        return cls(stop_times, *summary_train_arrays(stop_times, train_summary))
+
+    @property
+    def n_connections(self) -> int:
+        return len(self.dep_time)
+
+    def _buffers(self):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = (
+                np.empty(self.stop_times.n_stations, dtype=np.int64),   # arrival
+                np.empty(self.stop_times.n_stations, dtype=np.int64),   # connection that set it
+                np.empty(self.n_trips, dtype=np.int32),                 # first connection used per trip
+            )
+            self._local.buffers = buffers
+        return buffers
+
+    def _scan(self, origin: int, start: int, target: int = -1, min_connection: int = 30,
+              max_hours: int = 96, bound: int = UNREACHED):
+        """Earliest arrival at every station leaving origin at absolute week minute start.
+
+        Stops early once departures pass the target's arrival (or bound).
+        Returns the reused (arrival, in_connection, trip_entry) buffers.
+        """
+        arrival, in_connection, trip_entry = self._buffers()
+        arrival.fill(UNREACHED)
+        in_connection.fill(-1)
+        trip_entry.fill(NO_TRIP)
+        # Treat the origin as an arrival min_connection earlier, so every
+        # boarding, including the first, is just "arrival + min_connection"
+        arrival[origin] = start - min_connection
+        horizon = min(start + max_hours * 60, 2 * WEEK)
+
+        first = np.searchsorted(self.dep_time, start)
+        for s in range(start // SLICE_MINUTES, len(self.slice_starts) - 1):
+            lo, hi = max(self.slice_starts[s], first), self.slice_starts[s + 1]
+            if lo >= hi:
+                continue
+            cutoff = min(bound, horizon, arrival[target] if target >= 0 else UNREACHED)
+            if self.dep_time[lo] >= cutoff:
+                break
+            index = np.arange(lo, hi, dtype=np.int32)
+            dep_station, arr_station = self.dep_station[lo:hi], self.arr_station[lo:hi]
+            dep_time, arr_time, trip = self.dep_time[lo:hi], self.arr_time[lo:hi], self.conn_trip[lo:hi]
+            while True:
+                boards = (arrival[dep_station] + min_connection <= dep_time) & (trip_entry[trip] > index)
+                if boards.any():
+                    np.minimum.at(trip_entry, trip[boards], index[boards])
+                usable = trip_entry[trip] <= index
+                better = np.flatnonzero(usable & (arr_time < arrival[arr_station]) & (arr_time <= horizon))
+                if not len(better):
+                    break
+                # Best connection per arrival station in this pass
+                better = better[np.lexsort((arr_time[better], arr_station[better]))]
+                stations, firsts = np.unique(arr_station[better], return_index=True)
+                better = better[firsts]
+                arrival[stations] = arr_time[better]
+                in_connection[stations] = lo + better
+        arrival[origin] = start
+        return arrival, in_connection, trip_entry
+
+    def _journey(self, origin: int, target: int, in_connection, trip_entry, day_start: int) -> Journey:
+        legs = []
+        station = target
+        while station != origin:
+            alight = int(in_connection[station])
+            board = int(trip_entry[self.conn_trip[alight]])
+            legs.append(Leg(
+                train=int(self.stop_times.stop_train[self.conn_stop[alight]]),
+                board_stop=int(self.conn_stop[board]),
+                alight_stop=int(self.conn_stop[alight]) + 1,
+                departure=int(self.dep_time[board]) - day_start,
+                arrival=int(self.arr_time[alight]) - day_start,
+            ))
+            station = int(self.dep_station[board])
+        return Journey(legs=legs[::-1])
+
+    def earliest_arrival(self, from_code: str, to_code: str, weekday: int = 0, start: int = 0,
+                         min_connection: int = 30, max_hours: int = 96):
+        """Leave from_code at or after `start` on `weekday`; the earliest-arriving Journey or None."""
+        st_ = self.stop_times
+        origin = st_.station_lookup.get(from_code)
+        target = st_.station_lookup.get(to_code)
+        if origin is None or target is None or origin == target:
+            return None
+        day_start = weekday * MINUTES_PER_DAY
+        arrival, in_connection, trip_entry = self._scan(origin, day_start + start, target, min_connection, max_hours)
+        if arrival[target] >= UNREACHED:
+            return None
+        return self._journey(origin, target, in_connection, trip_entry, day_start)
+
+    def arrival_times(self, from_code: str, weekday: int = 0, start: int = 0,
+                      min_connection: int = 30, max_hours: int = 96) -> pd.Series:
+        """One-to-all: earliest arrival (minutes from the query day's midnight) per reachable station code."""
+        origin = self.stop_times.station_lookup.get(from_code)
+        if origin is None:
+            return pd.Series(dtype=np.int64)
+        day_start = weekday * MINUTES_PER_DAY
+        arrival, _, _ = self._scan(origin, day_start + start, -1, min_connection, max_hours)
+        reached = np.flatnonzero(arrival < UNREACHED)
+        return pd.Series(arrival[reached] - day_start, index=self.stop_times.station_codes[reached])
+
+    def profile(self, from_code: str, to_code: str, weekday: int = 0, start: int = 0, window: int = 1440,
+                min_connection: int = 30, max_hours: int = 96) -> list:
+        """Best arrival for every departure from from_code within `window` minutes of `start`.
+
+        Returns the Pareto-optimal journeys (no other one leaves later and
+        arrives no later), by departure. Departures are tried latest first, so
+        each scan can stop at the arrival of the one after it.
+        """
+        st_ = self.stop_times
+        origin = st_.station_lookup.get(from_code)
+        target = st_.station_lookup.get(to_code)
+        if origin is None or target is None or origin == target:
+            return []
+        day_start = weekday * MINUTES_PER_DAY
+        lo, hi = np.searchsorted(self.dep_time, [day_start + start, day_start + start + window])
+        departures = np.unique(self.dep_time[lo:hi][self.dep_station[lo:hi] == origin])
+
+        journeys = []
+        bound = UNREACHED
+        for departure in departures[::-1]:
+            arrival, in_connection, trip_entry = self._scan(
+                origin, int(departure), target, min_connection, max_hours, bound
+            )
+            if arrival[target] >= bound:
+                continue
+            bound = int(arrival[target])
+            journeys.append(self._journey(origin, target, in_connection, trip_entry, day_start))
+        return journeys[::-1]
+
+
+def profile_frame(scan: ConnectionScan, journeys: list, weekday: int) -> pd.DataFrame:
+    """One row per profile entry: when to leave, when you arrive, and how."""
+    train_numbers = scan.stop_times.train_numbers
+    minutes = np.array([j.arrival - j.departure for j in journeys], dtype=np.int64)
+    return pd.DataFrame({
+        "Departure": [format_time(j.departure, weekday) for j in journeys],
+        "Arrival": [format_time(j.arrival, weekday) for j in journeys],
+        "Duration": format_duration(minutes, True),
+        "Changes": [j.changes for j in journeys],
+        "Trains": [" → ".join(train_numbers[leg.train] for leg in j.legs) for j in journeys],
+    })
+
+
+def check(database_dir: str, schedule: str = "train_schedule_1.csv", origins: int = 150,
+          targets: int = 5, max_hours: int = 24, max_changes: int = 8, seed: int = 0) -> int:
+    """Random (origin, weekday, start) queries, with plan() to `targets` of the stations each reaches.
+
+    Prints each disagreement or backwards leg and returns how many there were.
+    """
+    from support_functions.snapshot import read_schedule
+    from support_functions.train_summary import build_train_summary
+
+    schedule_df, stop_times = read_schedule(os.path.join(database_dir, schedule))
+    train_summary = build_train_summary(schedule_df, stop_times)
+    planner = JourneyPlanner.from_summary(stop_times, train_summary)
+    scan = ConnectionScan.from_summary(stop_times, train_summary)
+
+    rng = np.random.default_rng(seed)
+    served = np.flatnonzero(np.diff(stop_times.posting_offsets) > 0)
+    failures = 0
+    for origin in rng.choice(served, origins):
+        code = stop_times.station_codes[origin]
+        weekday, start = int(rng.integers(len(DAYS))), int(rng.integers(MINUTES_PER_DAY))
+        query = f"{code} {format_time(start, weekday)}"
+        expected = scan.arrival_times(code, weekday, start, max_hours=max_hours).drop(code, errors="ignore")
+        reach = planner.reachable(code, weekday, start, max_hours, max_changes)
+        got = pd.Series(reach["arrival"].to_numpy(), index=reach["station"].to_numpy()).drop(code, errors="ignore")
+        if not got.sort_index().equals(expected.sort_index()):
+            both = pd.concat([got.rename("raptor"), expected.rename("csa")], axis=1)
+            print(f"{query}: {int((both['raptor'] != both['csa']).sum())} stations disagree")
+            failures += 1
+        for to_code in rng.choice(got.index, min(targets, len(got)), replace=False) if len(got) else []:
+            journeys = planner.plan(code, to_code, weekday, start, max_changes, max_hours=max_hours)
+            for leg in (leg for journey in journeys for leg in journey.legs):
+                if leg.arrival < leg.departure:
+                    print(f"{query} -> {to_code}: train {stop_times.train_numbers[leg.train]} "
+                          f"arrives {leg.arrival} before leaving {leg.departure}")
+                    failures += 1
+    print(f"{origins} origins, {failures} failures")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--database", default=os.path.join(os.getcwd(), "database"))
+    parser.add_argument("--schedule", default="train_schedule_1.csv")
+    parser.add_argument("--origins", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    raise SystemExit(1 if check(args.database, args.schedule, args.origins, seed=args.seed) else 0)
@@ -0,0 +1,122 @@
+"""Home page aggregates, built once per version of master_list.csv.
+
+For each view ("all" trains, "reserved" 10000-29999, "unreserved"
+30000-99999) the Home pages show five counts and two group tables, by train
+type and by zone, each with the train numbers in every group. Each group
+table is stored CSR-style: groups largest first, a count and offset per
+group, and one int array of train numbers. This pickles compactly through
+load_data's cache, and the pages only turn it into a DataFrame to display.
+
+The dataset version is a content hash of the columns the aggregates read,
+so figures cached against it are dropped when the data changes.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from config import train_type_lookup, train_type_lookup_unreserved
+
+
+REQUIRED_COLUMNS = {"Train No", "Train Type", "Zone"}
+# view -> (inclusive Train No range or None for every train, train type names)
+VIEWS = {
+    "all": (None, train_type_lookup),
+    "reserved": ((10000, 29999), train_type_lookup),
+    "unreserved": ((30000, 99999), train_type_lookup_unreserved),
+}
+
+
+def view_mask(master_train_df: pd.DataFrame, view: str) -> np.ndarray:
+    """Rows of master_train_df that belong to the view."""
+    number_range = VIEWS[view][0]
+    if number_range is None:
+        return np.ones(len(master_train_df), dtype=bool)
+    return pd.to_numeric(master_train_df["Train No"], errors="coerce").between(*number_range).to_numpy()
+
+
+def superfast_mask(train_numbers: pd.Series) -> np.ndarray:
+    """Superfast trains: the number starts with 2, or its second digit is 2 after a 0, 1 or 2."""
+    numbers = train_numbers.astype(str)
+    first, second = numbers.str[:1], numbers.str[1:2]
+    return ((first == "2") | (first.isin(["0", "1", "2"]) & (second == "2"))).to_numpy()
+
+
+@dataclass
+class GroupTable:
+    labels: np.ndarray
+    counts: np.ndarray
+    offsets: np.ndarray
+    train_numbers: np.ndarray
+
+    @classmethod
+    def build(cls, keys: pd.Series, train_numbers: np.ndarray) -> "GroupTable":
+        codes, labels = pd.factorize(keys, sort=True)
+        grouped = codes >= 0  # like groupby, rows without a key are left out
+        codes, train_numbers = codes[grouped], train_numbers[grouped]
+        counts = np.bincount(codes, minlength=len(labels))
+        # Largest group first; ties stay in label order
+        by_size = np.argsort(-counts, kind="stable")
+        rank = np.empty_like(by_size)
+        rank[by_size] = np.arange(len(by_size))
+        order = np.argsort(rank[codes], kind="stable")
+        counts = counts[by_size].astype(np.int32)
+        return cls(
+            labels=np.asarray(labels, dtype=object)[by_size],
+            counts=counts,
+            offsets=np.concatenate([[0], np.cumsum(counts)]),
+            train_numbers=train_numbers[order],
+        )
+
+    def frame(self, label: str) -> pd.DataFrame:
+        """label, Count and List of Train Nos per group, largest first."""
+        return pd.DataFrame({
+            label: self.labels,
+            "Count": self.counts,
+            "List of Train Nos": [self.train_numbers[a:b].tolist() for a, b in zip(self.offsets[:-1], self.offsets[1:])],
+        })
+
+
+@dataclass
+class DashboardView:
+    metrics: dict
+    by_type: GroupTable
+    by_zone: GroupTable
+
+
+@dataclass
+class Dashboard:
+    version: str
+    views: dict  # view name -> DashboardView, or None when master_list lacks REQUIRED_COLUMNS
+
+
+def build_dashboard(master_train_df: pd.DataFrame, station_df: pd.DataFrame) -> Dashboard:
+    n_stations = int(station_df["stationCode"].nunique())
+    if not REQUIRED_COLUMNS.issubset(master_train_df.columns):
+        return Dashboard("", {name: None for name in VIEWS})
+
+    columns = master_train_df[["Train No", "Train Type", "Zone"]]
+    version = format(int(pd.util.hash_pandas_object(columns, index=False).sum()) & (2 ** 64 - 1), "016x")
+    train_numbers = pd.to_numeric(columns["Train No"], errors="coerce")
+    superfast = superfast_mask(columns["Train No"])
+
+    views = {}
+    for name, (_, type_names) in VIEWS.items():
+        rows = view_mask(columns, name)
+        view = columns[rows]
+        numbers = train_numbers[rows].to_numpy()
+        numbers = numbers.astype(np.int32) if not np.isnan(numbers).any() else view["Train No"].to_numpy()
+        # Full train type names, falling back to the code
+        full_types = view["Train Type"].map(type_names).fillna(view["Train Type"])
+        views[name] = DashboardView(
+            metrics={
+                "Trains": int(view["Train No"].nunique()),
+                "Stations": n_stations,
+                "Superfast Trains": int(superfast[rows].sum()),
+                "Zones": int(view["Zone"].nunique()),
+                "Train Types": int(view["Train Type"].nunique()),
+            },
+            by_type=GroupTable.build(full_types, numbers),
+            by_zone=GroupTable.build(view["Zone"], numbers),
+        )
+    return Dashboard(version, views)
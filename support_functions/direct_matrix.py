@@ -0,0 +1,106 @@
+"""Station x station matrix of direct-train counts.
+
+Row i, column j counts the trains that call at station i and later at station
+j (each train's first call at either station, like StopTimes.direct_trips).
+Stored as CSR over station ids, built in one vectorized pass over StopTimes.
+
+    python -m support_functions.direct_matrix export --out direct_pairs.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from support_functions.stop_times import StopTimes
+
+
+class DirectMatrix:
+    def __init__(self, stop_times: StopTimes):
+        self.station_codes = stop_times.station_codes
+        self.station_lookup = stop_times.station_lookup
+        n_stations = stop_times.n_stations
+
+        # First call of each train at each station, still in (train, stop_seq) order
+        _, first = np.unique(
+            stop_times.stop_train.astype(np.int64) * n_stations + stop_times.station_id, return_index=True
+        )
+        calls = np.sort(first)
+        call_train = stop_times.stop_train[calls]
+        call_station = stop_times.station_id[calls].astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, call_train[1:] != call_train[:-1]])
+        lengths = np.diff(np.r_[starts, len(calls)])
+
+        # Every ordered pair of calls within a train, generated per route length
+        keys = []
+        for length in np.unique(lengths):
+            if length < 2:
+                continue
+            a, b = np.triu_indices(length, k=1)
+            base = starts[lengths == length][:, None]
+            keys.append((call_station[base + a] * n_stations + call_station[base + b]).ravel())
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+
+        pairs, counts = np.unique(keys, return_counts=True)
+        rows = pairs // n_stations
+        self.indices = (pairs % n_stations).astype(np.int32)
+        self.counts = counts.astype(np.int32)
+        self.indptr = np.zeros(n_stations + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_stations), out=self.indptr[1:])
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def _row(self, code: str) -> slice:
+        sid = self.station_lookup.get(code)
+        if sid is None:
+            return slice(0, 0)
+        return slice(self.indptr[sid], self.indptr[sid + 1])
+
+    def count(self, from_code: str, to_code: str) -> int:
+        """Number of direct trains from_code -> to_code."""
+        row = self._row(from_code)
+        to = self.station_lookup.get(to_code)
+        if to is None:
+            return 0
+        columns = self.indices[row]
+        i = np.searchsorted(columns, to)
+        return int(self.counts[row][i]) if i < len(columns) and columns[i] == to else 0
+
+    def destinations(self, from_code: str) -> pd.Series:
+        """Direct-train count per reachable To station code, most connected first."""
+        row = self._row(from_code)
+        counts = pd.Series(self.counts[row], index=self.station_codes[self.indices[row]])
+        return counts.sort_values(ascending=False, kind="stable")
+
+    def to_frame(self) -> pd.DataFrame:
+        """All pairs with at least one direct train, for bulk export."""
+        rows = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        return pd.DataFrame({
+            "from": self.station_codes[rows],
+            "to": self.station_codes[self.indices],
+            "direct_trains": self.counts,
+        })
+
+
+def export(database_dir: str, out: str, schedule: str = "reserved_train_schedule.csv"):
+    from support_functions.snapshot import read_schedule
+
+    _, stop_times = read_schedule(os.path.join(database_dir, schedule))
+    frame = DirectMatrix(stop_times).to_frame()
+    if out.endswith(".parquet"):
+        frame.to_parquet(out, index=False)
+    else:
+        frame.to_csv(out, index=False)
+    print(f"{len(frame)} station pairs -> {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--database", default=os.path.join(os.getcwd(), "database"))
+    parser.add_argument("--schedule", default="reserved_train_schedule.csv")
+    parser.add_argument("--out", default="direct_pairs.csv")
+    args = parser.parse_args()
+    export(args.database, args.out, args.schedule)
@@ -0,0 +1,341 @@
+"""Backfill missing coordinates in station_index_with_coords.csv.
+
+Stations without Latitude/Longitude, plus any that map_plot queued because
+they were not in the file at all, are geocoded outside the app. Requests go
+through a token bucket (Nominatim's policy is one per second) with several in
+flight at once, so slow responses overlap instead of adding up.
+
+Every answer is kept in a SQLite cache next to the CSV: hits with their
+coordinates, and misses and errors with a retry-after time, so a rerun only
+asks about stations that are new or due again. Hits are merged into the CSV
+through a temporary file and os.replace, which the app's coord_index() picks
+up by mtime.
+
+The geocoder is any callable query -> (lat, lon) or None that raises on
+transient failures; NominatimGeocoder takes a domain/scheme so the job can be
+pointed at a local stub server.
+
+    python -m support_functions.geocode_backfill run --rate 1 --workers 4
+    python -m support_functions.geocode_backfill status
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+
+from support_functions.snapshot import write_atomic
+
+
+COORD_FILE = "station_index_with_coords.csv"
+CACHE_FILE = "geocode_cache.sqlite"
+COLUMNS = ["stationCode", "stationName", "Latitude", "Longitude"]
+
+# Plausible coordinates for an Indian station
+LAT_RANGE = (6, 38)
+LON_RANGE = (68, 97)
+
+MISS_RETRY_SECONDS = 30 * 24 * 3600
+ERROR_RETRY_SECONDS = 60
+ERROR_RETRY_MAX_SECONDS = 24 * 3600
+
+
+def _normalize(name: str) -> str:
+    # Imported on use: support_modules imports this module for queue_stations
+    from support_functions.support_modules import normalize_station_name
+    return normalize_station_name(name)
+
+
+def station_query(name: str) -> str:
+    return f"{_normalize(name)} Railway Station, India"
+
+
+class NominatimGeocoder:
+    """geopy's Nominatim as a query -> (lat, lon) callable."""
+
+    def __init__(self, user_agent: str = "streamlit-train-route", domain: str = None,
+                 scheme: str = None, timeout: float = 10):
+        from geopy.geocoders import Nominatim
+
+        options = {"user_agent": user_agent, "timeout": timeout}
+        if domain:
+            options["domain"] = domain
+        if scheme:
+            options["scheme"] = scheme
+        self._geolocator = Nominatim(**options)
+
+    def __call__(self, query: str):
+        location = self._geolocator.geocode(query)
+        if location is None:
+            return None
+        return location.latitude, location.longitude
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average and up to `burst` back to back."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold every caller back for `seconds`, e.g. after the server asked to slow down."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class GeocodeCache:
+    """SQLite table of geocoding outcomes, plus the queue of stations map_plot could not place.
+
+    status is "hit" (lat/lon set), "miss" (no usable answer) or "error"
+    (request failed); misses and errors are not asked again before retry_after.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS geocode (
+                    query TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    lat REAL,
+                    lon REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    retry_after REAL,
+                    updated REAL NOT NULL
+                )""")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS pending (
+                    station_name TEXT PRIMARY KEY,
+                    station_code TEXT,
+                    queued REAL NOT NULL
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def lookup(self, queries) -> dict:
+        """query -> (status, lat, lon, attempts, retry_after) for the queries that have an entry."""
+        queries = list(queries)
+        found = {}
+        with self._connect() as db:
+            for start in range(0, len(queries), 500):
+                part = queries[start:start + 500]
+                rows = db.execute(
+                    f"SELECT query, status, lat, lon, attempts, retry_after FROM geocode "
+                    f"WHERE query IN ({','.join('?' * len(part))})", part)
+                for query, *entry in rows:
+                    found[query] = tuple(entry)
+        return found
+
+    def record(self, query: str, status: str, point=None, retry_after: float = None):
+        lat, lon = point if point is not None else (None, None)
+        with self._connect() as db:
+            db.execute("""
+                INSERT INTO geocode (query, status, lat, lon, attempts, retry_after, updated)
+                VALUES (?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT(query) DO UPDATE SET
+                    status = excluded.status, lat = excluded.lat, lon = excluded.lon,
+                    attempts = attempts + 1, retry_after = excluded.retry_after, updated = excluded.updated
+                """, (query, status, lat, lon, retry_after, time.time()))
+
+    def queue(self, stations):
+        """Ask the next backfill run to place these (code, name) stations."""
+        now = time.time()
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO pending (station_name, station_code, queued) VALUES (?, ?, ?)",
+                [(name, code, now) for code, name in stations])
+
+    def pending(self) -> list:
+        with self._connect() as db:
+            return db.execute("SELECT station_code, station_name FROM pending ORDER BY queued").fetchall()
+
+    def clear_pending(self, names):
+        with self._connect() as db:
+            db.executemany("DELETE FROM pending WHERE station_name = ?", [(name,) for name in names])
+
+    def status_counts(self) -> dict:
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM geocode GROUP BY status"))
+            counts["pending"] = db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+        return counts
+
+
+def queue_stations(stations, database_dir: str = None):
+    """Called by map_plot: record (code, name) stations without coordinates; never geocodes."""
+    database_dir = database_dir or os.path.join(os.getcwd(), "database")
+    GeocodeCache(os.path.join(database_dir, CACHE_FILE)).queue(stations)
+
+
+def read_coords(coord_file: str) -> pd.DataFrame:
+    if os.path.exists(coord_file):
+        return pd.read_csv(coord_file)
+    return pd.DataFrame(columns=COLUMNS)
+
+
+def _targets(coord_df: pd.DataFrame, pending: list) -> dict:
+    """query -> (code, name) of every station that still needs coordinates."""
+    targets = {}
+    missing = coord_df[coord_df["Latitude"].isna() | coord_df["Longitude"].isna()]
+    for code, name in zip(missing["stationCode"], missing["stationName"]):
+        if isinstance(name, str) and name.strip():
+            targets.setdefault(station_query(name), (code, name))
+    placed = set(coord_df.loc[coord_df["Latitude"].notna() & coord_df["Longitude"].notna(), "stationName"]
+                 .dropna().map(_normalize))
+    for code, name in pending:
+        if _normalize(name) not in placed:
+            targets.setdefault(station_query(name), (code, name))
+    return targets
+
+
+def _due(entry, now: float) -> bool:
+    if entry is None:
+        return True
+    status, _, _, _, retry_after = entry
+    return status != "hit" and (retry_after is None or retry_after <= now)
+
+
+def _retry_after(error: Exception, attempts: int, now: float) -> float:
+    # geopy's GeocoderRateLimited carries the server's Retry-After
+    server_wait = getattr(error, "retry_after", None)
+    if server_wait:
+        return now + float(server_wait)
+    return now + min(ERROR_RETRY_SECONDS * 2 ** attempts, ERROR_RETRY_MAX_SECONDS)
+
+
+def merge(coord_file: str, hits: dict) -> int:
+    """Write hits ({(code, name): (lat, lon)}) into the coordinates file atomically.
+
+    Rows with the station's name and no coordinates are filled; stations not
+    in the file are appended. Returns the number of stations written.
+    """
+    if not hits:
+        return 0
+    coord_df = read_coords(coord_file)
+    norm = coord_df["stationName"].map(lambda name: _normalize(name) if isinstance(name, str) else None)
+    blank = coord_df["Latitude"].isna() | coord_df["Longitude"].isna()
+    new_rows = []
+    written = 0
+    for (code, name), (lat, lon) in hits.items():
+        rows = norm == _normalize(name)
+        if rows.any():
+            fill = rows & blank
+            if not fill.any():
+                continue
+            coord_df.loc[fill, "Latitude"] = lat
+            coord_df.loc[fill, "Longitude"] = lon
+        else:
+            new_rows.append({"stationCode": code, "stationName": name, "Latitude": lat, "Longitude": lon})
+        written += 1
+    if new_rows:
+        coord_df = pd.concat([coord_df, pd.DataFrame(new_rows, columns=COLUMNS)], ignore_index=True)
+    if written:
+        write_atomic(coord_file, lambda tmp: coord_df.to_csv(tmp, index=False))
+    return written
+
+
+def backfill(database_dir: str, geocoder=None, rate: float = 1.0, burst: int = 1, workers: int = 4,
+             limit: int = None, retry_errors: bool = False) -> dict:
+    """Geocode every station that needs it and is due, then merge the hits into the CSV."""
+    coord_file = os.path.join(database_dir, COORD_FILE)
+    cache = GeocodeCache(os.path.join(database_dir, CACHE_FILE))
+    geocoder = geocoder or NominatimGeocoder()
+    bucket = TokenBucket(rate, burst)
+
+    pending = cache.pending()
+    targets = _targets(read_coords(coord_file), pending)
+    known = cache.lookup(targets)
+    now = time.time()
+    due = [query for query in targets if retry_errors or _due(known.get(query), now)]
+    if limit is not None:
+        due = due[:limit]
+    stats = {"targets": len(targets), "asked": len(due), "hit": 0, "miss": 0, "error": 0}
+
+    def ask(query):
+        bucket.acquire()
+        try:
+            return query, geocoder(query), None
+        except Exception as error:
+            if getattr(error, "retry_after", None):
+                bucket.pause(float(error.retry_after))
+            return query, None, error
+
+    def collect(future):
+        query, point, error = future.result()
+        attempts = known[query][3] if query in known else 0
+        if error is not None:
+            cache.record(query, "error", retry_after=_retry_after(error, attempts, time.time()))
+            stats["error"] += 1
+        elif point is not None and LAT_RANGE[0] <= point[0] <= LAT_RANGE[1] and LON_RANGE[0] <= point[1] <= LON_RANGE[1]:
+            cache.record(query, "hit", point)
+            stats["hit"] += 1
+        else:
+            cache.record(query, "miss", retry_after=time.time() + MISS_RETRY_SECONDS)
+            stats["miss"] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        in_flight = deque()
+        for query in due:
+            in_flight.append(pool.submit(ask, query))
+            while len(in_flight) >= workers * 2 or (in_flight and in_flight[0].done()):
+                collect(in_flight.popleft())
+        while in_flight:
+            collect(in_flight.popleft())
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+
+    # Earlier runs' hits are merged too, in case the CSV was replaced since
+    placed = {query: (lat, lon)
+              for query, (status, lat, lon, _, _) in cache.lookup(targets).items() if status == "hit"}
+    stats["merged"] = merge(coord_file, {targets[query]: point for query, point in placed.items()})
+    cache.clear_pending([name for _, name in pending if station_query(name) in placed])
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--database", default=os.path.join(os.getcwd(), "database"))
+    parser.add_argument("--rate", type=float, default=1.0, help="requests per second")
+    parser.add_argument("--burst", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4, help="requests in flight")
+    parser.add_argument("--limit", type=int, default=None, help="ask about at most this many stations")
+    parser.add_argument("--retry-errors", action="store_true", help="ignore retry-after times")
+    parser.add_argument("--domain", default=None, help="Nominatim host[:port], e.g. localhost:8080")
+    parser.add_argument("--scheme", default=None)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        geocoder = NominatimGeocoder(domain=args.domain, scheme=args.scheme)
+        stats = backfill(args.database, geocoder, args.rate, args.burst, args.workers, args.limit, args.retry_errors)
+        print(json.dumps(stats))
+    else:
+        print(json.dumps(GeocodeCache(os.path.join(args.database, CACHE_FILE)).status_counts()))
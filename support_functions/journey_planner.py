@@ -0,0 +1,355 @@
+"""Round-based (RAPTOR) multi-leg journey planning over a StopTimes schedule.
+
+Every train is its own route and its day-by-day runs are the trips of that
+route, so catching "the next run" of a train is arithmetic on its running-day
+mask rather than a search over trip lists. Each round scans all trains at once
+as flat arrays: boarding options at the stations improved by the previous
+round are carried down each train's stop sequence with a segmented minimum,
+and the resulting arrivals are reduced to the best one per station.
+
+Times are absolute minutes from midnight of the query day.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from support_functions.stop_times import (
+    StopTimes, format_duration, format_hhmm, hop_chains, origin_day_offsets, valid_hops,
+)
+from support_functions.train_summary import DAYS
+
+
+MINUTES_PER_DAY = 1440
+NOT_REACHED = np.iinfo(np.int64).max
+# Train runs (origin-day offsets from the query day) are encoded in [0, RUN_SLOTS)
+RUN_SHIFT = 16
+RUN_SLOTS = 64
+
+
+def _next_run_table() -> np.ndarray:
+    """[days_mask, weekday] -> days until the train next leaves its origin (RUN_SLOTS if never)."""
+    table = np.full((1 << len(DAYS), len(DAYS)), RUN_SLOTS, dtype=np.int64)
+    for mask in range(1, 1 << len(DAYS)):
+        for weekday in range(len(DAYS)):
+            table[mask, weekday] = next(
+                wait for wait in range(len(DAYS)) if mask >> ((weekday + wait) % len(DAYS)) & 1
+            )
+    return table
+
+
+NEXT_RUN = _next_run_table()
+
+
+@dataclass
+class Leg:
+    train: int
+    board_stop: int
+    alight_stop: int
+    departure: int   # absolute minutes
+    arrival: int
+
+
+@dataclass
+class Journey:
+    legs: list
+
+    @property
+    def changes(self) -> int:
+        return len(self.legs) - 1
+
+    @property
+    def departure(self) -> int:
+        return self.legs[0].departure
+
+    @property
+    def arrival(self) -> int:
+        return self.legs[-1].arrival
+
+
+def summary_train_arrays(stop_times: StopTimes, train_summary: pd.DataFrame):
+    """(days_masks, train_names) by StopTimes train id, from the train summary."""
+    trains = train_summary.index.to_numpy()
+    days_masks = np.zeros(stop_times.n_trains, dtype=np.int64)
+    days_masks[trains] = train_summary["days_mask"].to_numpy()
+    train_names = np.full(stop_times.n_trains, "", dtype=object)
+    train_names[trains] = train_summary["Train Name"].to_numpy()
+    return days_masks, train_names
+
+
+class JourneyPlanner:
+    """Precomputed arrays for RAPTOR queries over one schedule.
+
+    days_masks holds each train's running-day mask (bit i = DAYS[i]) by
+    StopTimes train id; a train's run "on day D" is the one leaving its origin
+    on D, and the per-stop day counter places later stops on later days.
+    """
+
+    def __init__(self, stop_times: StopTimes, days_masks: np.ndarray, train_names=None):
+        self.stop_times = stop_times
+        self.days_masks = np.asarray(days_masks, dtype=np.int64)
+        self.train_names = np.full(stop_times.n_trains, "", dtype=object) if train_names is None else train_names
+        self.dep_offset, self.arr_offset, self.can_board, self.can_alight = origin_day_offsets(stop_times)
+        # A trip is boarded only where a valid hop leaves, alighted only where one
+        # arrives, and a boarding is carried along its hop chain only, as in ConnectionScan
+        hops = valid_hops(stop_times, self.dep_offset, self.arr_offset, self.can_board, self.can_alight)
+        self.hop_out = np.zeros(stop_times.n_stops, dtype=bool)
+        self.hop_out[hops] = True
+        self.hop_in = np.zeros(stop_times.n_stops, dtype=bool)
+        self.hop_in[hops + 1] = True
+        self.chain = hop_chains(stop_times.n_stops, hops)
+        self.chain_starts = np.flatnonzero(np.diff(self.chain, prepend=-1) > 0)
+
+        self.station_starts = stop_times.posting_offsets[:-1]
+        self.station_served = np.diff(stop_times.posting_offsets) > 0
+        # Per-chain key span for the segmented minimum (see _scan)
+        self.span = RUN_SLOTS * max(stop_times.n_stops, 1)
+
+    @classmethod
+    def from_summary(cls, stop_times: StopTimes, train_summary: pd.DataFrame) -> "JourneyPlanner":
+        return cls(stop_times, *summary_train_arrays(stop_times, train_summary))
+
+    def _scan(self, ready: np.ndarray, horizon: int, weekday: int):
+        """One round: best trip of every train boardable from `ready`, per stop.
+
+        ready[s] is the earliest time a passenger can board at stop s (or
+        NOT_REACHED). Returns (arrival, board_stop, run) per stop, where arrival
+        is NOT_REACHED if no earlier stop of the same train could be boarded.
+        """
+        st_ = self.stop_times
+        n = st_.n_stops
+        stops = np.flatnonzero((ready != NOT_REACHED) & self.hop_out)
+        if not len(stops):
+            return None
+
+        # Earliest run of each train leaving these stops at or after `ready`
+        dep = self.dep_offset[stops]
+        run = -((dep - ready[stops]) // MINUTES_PER_DAY)
+        masks = self.days_masks[st_.stop_train[stops]]
+        run += NEXT_RUN[masks, (weekday + run) % len(DAYS)]
+        ok = (run * MINUTES_PER_DAY + dep <= horizon) & (run + RUN_SHIFT >= 0) & (run + RUN_SHIFT < RUN_SLOTS)
+        stops, run = stops[ok], run[ok]
+
+        # key = run slot * n + boarding stop, offset per hop chain so that a
+        # plain running minimum never crosses into the next train or chain
+        segment = self.chain.astype(np.int64) * self.span
+        none = (RUN_SLOTS - 1) * n
+        key = np.full(n, none, dtype=np.int64)
+        key[stops] = (run + RUN_SHIFT) * n + stops
+        best = np.minimum.accumulate(key - segment)
+        # Alight strictly after boarding: shift by one stop within each chain
+        carried = np.empty(n, dtype=np.int64)
+        carried[1:] = best[:-1]
+        carried[self.chain_starts] = none - segment[self.chain_starts]
+        carried += segment
+
+        has_trip = (carried < none) & self.hop_in
+        board_stop = carried % n
+        run = carried // n - RUN_SHIFT
+        arrival = run * MINUTES_PER_DAY + self.arr_offset
+        # Never arrive before the boarding departure
+        has_trip &= arrival >= run * MINUTES_PER_DAY + self.dep_offset[board_stop]
+        arrival = np.where(has_trip, arrival, NOT_REACHED)
+        arrival[arrival > horizon] = NOT_REACHED
+        return arrival, board_stop, run
+
+    def _best_per_station(self, arrival: np.ndarray):
+        """Earliest arrival per station and the stop that achieves it."""
+        st_ = self.stop_times
+        n = st_.n_stops
+        posting = st_.posting_stops
+        key = np.where(arrival[posting] == NOT_REACHED, NOT_REACHED, arrival[posting] * n + posting)
+        best = np.full(st_.n_stations, NOT_REACHED, dtype=np.int64)
+        served = self.station_served
+        best[served] = np.minimum.reduceat(key, self.station_starts[served])
+        reached = best != NOT_REACHED
+        time = np.where(reached, best // n, NOT_REACHED)
+        stop = np.where(reached, best % n, -1)
+        return time, stop
+
+    def _rounds(self, origin: int, weekday: int, start: int, max_changes: int,
+                min_connection: int, horizon: int, target: int = -1):
+        """Run RAPTOR rounds from origin; yields the growing label list after each round.
+
+        Each label is (alight stop per station, board stop per stop, run per
+        stop); the alight stop is -1 unless the station improved in that round.
+        With a target, improvements later than its best arrival are pruned.
+        """
+        st_ = self.stop_times
+        best_time = np.full(st_.n_stations, NOT_REACHED, dtype=np.int64)
+        best_time[origin] = start
+        round_time = best_time.copy()
+        marked = np.zeros(st_.n_stations, dtype=bool)
+        marked[origin] = True
+        labels = []
+
+        for round_no in range(max_changes + 1):
+            transfer = 0 if round_no == 0 else min_connection
+            ready_station = np.full(st_.n_stations, NOT_REACHED, dtype=np.int64)
+            ready_station[marked] = round_time[marked] + transfer
+            scanned = self._scan(ready_station[st_.station_id], horizon, weekday)
+            if scanned is None:
+                return
+            arrival, board_stop, run = scanned
+            time, stop = self._best_per_station(arrival)
+
+            # Keep improvements only, pruned by the best arrival at the target
+            bound = best_time if target < 0 else np.minimum(best_time, best_time[target])
+            improved = time < bound
+            improved[origin] = False
+            best_time[improved] = time[improved]
+            round_time = np.where(improved, time, NOT_REACHED)
+            labels.append((np.where(improved, stop, -1), board_stop, run))
+            yield labels
+            marked = improved
+            if not marked.any():
+                return
+
+    def plan(self, from_code: str, to_code: str, weekday: int = 0, start: int = 0,
+             max_changes: int = 2, min_connection: int = 30, max_hours: int = 96) -> list:
+        """Pareto-optimal journeys (earliest arrival vs. number of changes).
+
+        Leaves from_code at or after `start` minutes on `weekday` (index into
+        DAYS) and allows up to max_changes changes of train, each with at least
+        min_connection minutes between arrival and departure. Journeys arriving
+        more than max_hours after `start` are not considered. The result is
+        ordered by changes; each journey arrives strictly earlier than every
+        journey with fewer changes.
+        """
+        st_ = self.stop_times
+        origin = st_.station_lookup.get(from_code)
+        target = st_.station_lookup.get(to_code)
+        if origin is None or target is None or origin == target:
+            return []
+        journeys = []
+        for labels in self._rounds(origin, weekday, start, max_changes, min_connection, start + max_hours * 60, target):
+            if labels[-1][0][target] >= 0:
+                journeys.append(self._journey(labels, target))
+        return journeys
+
+    def reachable(self, from_code: str, weekday: int = 0, start: int = 0, max_hours: int = 12,
+                  max_changes: int = 1, min_connection: int = 30) -> pd.DataFrame:
+        """Isochrone: every station reachable from from_code within max_hours.
+
+        One RAPTOR expansion without a target; the frontier of each round is the
+        set of stations it improved. Per station: earliest arrival (minutes from
+        the query day's midnight), changes needed and the train numbers used,
+        built round by round from the boarding station's chain.
+        """
+        st_ = self.stop_times
+        origin = st_.station_lookup.get(from_code)
+        if origin is None:
+            return pd.DataFrame(columns=["station", "arrival", "changes", "trains", "alight_stop"])
+
+        arrival = np.full(st_.n_stations, NOT_REACHED, dtype=np.int64)
+        changes = np.full(st_.n_stations, -1, dtype=np.int64)
+        alight_stop = np.full(st_.n_stations, -1, dtype=np.int64)
+        trains = np.full(st_.n_stations, "", dtype=object)
+        labels = []
+        for labels in self._rounds(origin, weekday, start, max_changes, min_connection, start + max_hours * 60):
+            round_no = len(labels) - 1
+            alight_at, board_stop, run = labels[-1]
+            stations = np.flatnonzero(alight_at >= 0)
+            alight = alight_at[stations]
+            board_station = st_.station_id[board_stop[alight]]
+            # Boarding stations were reached in the previous round (or are the origin)
+            numbers = st_.train_numbers[st_.stop_train[alight]].astype(object)
+            trains[stations] = np.where(
+                trains[board_station] == "", numbers, trains[board_station] + " → " + numbers
+            )
+            arrival[stations] = run[alight] * MINUTES_PER_DAY + self.arr_offset[alight]
+            changes[stations] = round_no
+            alight_stop[stations] = alight
+
+        reached = np.flatnonzero(alight_stop >= 0)
+        order = np.argsort(arrival[reached], kind="stable")
+        reached = reached[order]
+        return pd.DataFrame({
+            "station": st_.station_codes[reached],
+            "arrival": arrival[reached],
+            "changes": changes[reached],
+            "trains": trains[reached],
+            "alight_stop": alight_stop[reached],
+        })
+
+    def _journey(self, labels: list, station: int) -> Journey:
+        """Walk the per-round labels back from station to the origin."""
+        st_ = self.stop_times
+        legs = []
+        for alight_at, board_stop, run in reversed(labels):
+            # Each leg boarded at a station improved in the round before
+            alight = int(alight_at[station])
+            board = int(board_stop[alight])
+            day = int(run[alight]) * MINUTES_PER_DAY
+            legs.append(Leg(
+                train=int(st_.stop_train[alight]),
+                board_stop=board,
+                alight_stop=alight,
+                departure=day + int(self.dep_offset[board]),
+                arrival=day + int(self.arr_offset[alight]),
+            ))
+            station = int(st_.station_id[board])
+        return Journey(legs=legs[::-1])
+
+
+def reachable_frame(planner: JourneyPlanner, reach: pd.DataFrame, weekday: int, start: int) -> pd.DataFrame:
+    """Display table for JourneyPlanner.reachable, in the search pages' style."""
+    st_ = planner.stop_times
+    # Nothing arrives before the query start; never show a negative travel time
+    reach = reach[reach["arrival"].to_numpy() >= start]
+    stops = reach["alight_stop"].to_numpy()
+    minutes = reach["arrival"].to_numpy() - start
+    return pd.DataFrame({
+        "Station Code": reach["station"].to_numpy(),
+        "Station Name": st_.stop_name[stops],
+        "Arrival": [format_time(int(m), weekday) for m in reach["arrival"]],
+        "Travel Time": format_duration(minutes, True),
+        "Changes": reach["changes"].to_numpy(),
+        "Trains": reach["trains"].to_numpy(),
+        "minutes": minutes,
+    })
+
+
+def format_time(minutes: int, weekday: int) -> str:
+    """Absolute query minutes -> "Mon 06:15"."""
+    return f"{DAYS[(weekday + minutes // MINUTES_PER_DAY) % len(DAYS)]} {format_hhmm(minutes % MINUTES_PER_DAY)}"
+
+
+def journeys_frame(planner: JourneyPlanner, journeys: list, weekday: int) -> pd.DataFrame:
+    """One row per leg, numbered by option, in the search pages' display style."""
+    st_ = planner.stop_times
+    codes = st_.station_codes
+    rows = []
+    for option, journey in enumerate(journeys, start=1):
+        previous_arrival = None
+        for leg_no, leg in enumerate(journey.legs, start=1):
+            board_station = codes[st_.station_id[leg.board_stop]]
+            alight_station = codes[st_.station_id[leg.alight_stop]]
+            wait = "-" if previous_arrival is None else f"{leg.departure - previous_arrival} min"
+            rows.append({
+                "Option": option,
+                "Changes": journey.changes,
+                "Leg": leg_no,
+                "Train No": st_.train_numbers[leg.train],
+                "Train Name": planner.train_names[leg.train],
+                "From": f"{board_station} - {st_.stop_name[leg.board_stop]}",
+                "Departure": format_time(leg.departure, weekday),
+                "To": f"{alight_station} - {st_.stop_name[leg.alight_stop]}",
+                "Arrival": format_time(leg.arrival, weekday),
+                "Connection Wait": wait,
+            })
+            previous_arrival = leg.arrival
+    return pd.DataFrame(rows)
+
+
+def plan_journeys(planner: JourneyPlanner, from_code: str, to_code: str,
+                  day: str = "Mon", time: str = "00:00", **options) -> pd.DataFrame:
+    """Pareto journeys from_code -> to_code as a leg table.
+
+    day is one of DAYS and time is "HH:MM"; options go to JourneyPlanner.plan
+    (max_changes, min_connection, max_hours).
+    """
+    weekday = DAYS.index(day)
+    hh, mm = time.split(":")
+    journeys = planner.plan(from_code, to_code, weekday, int(hh) * 60 + int(mm), **options)
+    return journeys_frame(planner, journeys, weekday)
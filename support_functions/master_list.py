@@ -0,0 +1,120 @@
+"""Typed columns for master_list.csv.
+
+The CSV keeps its figures as display text: "30h 5m", "1860 km", "62 km/hr",
+"S M T W T F S" and "SL 3A 2A 1A 3E". typed_master_list() parses them once,
+with pandas string and regex operations, into the same lowercase columns build_train_summary() gives the search pages:
+
+- dep_min / arr_min: int16 minutes since midnight (MISSING_TIME when absent)
+- duration_min / distance_km: nullable Int32
+- speed_kmh: float, NaN when absent
+- days_mask / class_mask: bitmasks, so filter_trains() works on this frame too
+
+The columns repeat a few hundred distinct values at most, so like parse_hhmm
+each parser factorizes first, runs the string operations on the distinct
+values only and indexes the result back out. The display columns are left
+as they are.
+"""
+import numpy as np
+import pandas as pd
+
+from support_functions.stop_times import parse_hhmm
+from support_functions.train_summary import CLASS_BITS, DAYS
+
+
+# "S M T W T F S": one letter per day from Sunday, anything else in a slot means not running
+DAY_LETTERS = np.array(list("SMTWTFS"), dtype=object)
+DURATION_PATTERN = r"^\s*(?:(?P<h>\d+)\s*h)?\s*(?:(?P<m>\d+)\s*m)?\s*$"
+NUMBER_PATTERN = r"(\d+(?:\.\d+)?)"
+# Typed column -> (label, unit) for the Home pages' range filters
+RANGE_COLUMNS = {
+    "distance_km": ("Distance", "km"),
+    "speed_kmh": ("Speed", "km/h"),
+    "duration_min": ("Duration", "h"),
+}
+
+
+def _text(values: pd.Series) -> pd.Series:
+    return values.astype("string").str.strip()
+
+
+def _per_unique(values: pd.Series, parse, missing):
+    """parse() over the distinct values, taken back to every row; missing for NaN rows."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    parsed = np.asarray(parse(pd.Series(uniques, dtype=object)))
+    # factorize marks NaN with -1, which picks the trailing missing slot
+    return np.append(parsed, np.array([missing], dtype=parsed.dtype))[codes]
+
+
+def _duration_minutes(values: pd.Series) -> np.ndarray:
+    parts = _text(values).str.extract(DURATION_PATTERN)
+    hours = pd.to_numeric(parts["h"], errors="coerce").astype(float)
+    minutes = pd.to_numeric(parts["m"], errors="coerce").astype(float)
+    total = hours.fillna(0) * 60 + minutes.fillna(0)
+    return total.where(hours.notna() | minutes.notna()).to_numpy(dtype=float)
+
+
+def parse_duration(values: pd.Series) -> pd.arrays.IntegerArray:
+    """"30h 5m" / "5h" / "45m" -> minutes; <NA> when neither part is there."""
+    return pd.array(_per_unique(values, _duration_minutes, np.nan), dtype="Int32")
+
+
+def parse_number(values: pd.Series, unit: str) -> pd.Series:
+    """Leading number of "1860 km" / "62 km/hr" style values as float; NaN without the unit."""
+    def leading_number(uniques):
+        number = _text(uniques).str.extract(rf"^{NUMBER_PATTERN}\s*{unit}", expand=False)
+        return pd.to_numeric(number, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    return pd.Series(_per_unique(values, leading_number, np.nan), index=values.index)
+
+
+def parse_days(values: pd.Series) -> np.ndarray:
+    """"S M T W T F S" (slot per day from Sunday) -> uint8 mask, bit i for DAYS[i]."""
+    def mask(uniques):
+        slots = _text(uniques).str.upper().str.split(expand=True)
+        slots = slots.reindex(columns=range(len(DAYS))).fillna("").to_numpy(dtype=object)
+        return ((slots == DAY_LETTERS) * (1 << np.arange(len(DAYS)))).sum(axis=1).astype(np.uint8)
+    return _per_unique(values, mask, 0)
+
+
+def parse_classes(values: pd.Series) -> np.ndarray:
+    """"SL 3A 2A 1A 3E" -> int32 mask over CLASS_BITS (case-insensitive, so "Ex" is EX)."""
+    def mask(uniques):
+        tokens = _text(uniques).str.upper().str.replace(r"\s+", " ", regex=True)
+        dummies = tokens.str.get_dummies(sep=" ")
+        bits = np.array([CLASS_BITS.get(cls, 0) for cls in dummies.columns], dtype=np.int32)
+        return dummies.to_numpy(dtype=np.int32) @ bits if len(bits) else np.zeros(len(uniques), dtype=np.int32)
+    return _per_unique(values, mask, 0)
+
+
+def typed_master_list(master_train_df: pd.DataFrame) -> pd.DataFrame:
+    """master_train_df plus the typed columns of the module docstring (where the source column exists)."""
+    df = master_train_df.copy()
+    if "Dep" in df:
+        df["dep_min"] = parse_hhmm(df["Dep"].to_numpy())
+    if "Arr" in df:
+        df["arr_min"] = parse_hhmm(df["Arr"].to_numpy())
+    if "Duration" in df:
+        df["duration_min"] = parse_duration(df["Duration"])
+    if "Distance" in df:
+        df["distance_km"] = parse_number(df["Distance"], "km").round().astype("Int32")
+    if "Speed" in df:
+        df["speed_kmh"] = parse_number(df["Speed"], "km")
+    if "Days" in df:
+        df["days_mask"] = parse_days(df["Days"])
+    if "Classes" in df:
+        df["class_mask"] = parse_classes(df["Classes"])
+    return df
+
+
+def range_mask(df: pd.DataFrame, ranges: dict) -> np.ndarray:
+    """Rows whose typed columns fall inside every inclusive (low, high) range; None leaves a side open.
+
+    Rows without a value for a bounded column are left out (NaN fails both comparisons).
+    """
+    keep = np.ones(len(df), dtype=bool)
+    for column, (low, high) in ranges.items():
+        values = df[column].to_numpy(dtype=float, na_value=np.nan)
+        if low is not None:
+            keep &= values >= low
+        if high is not None:
+            keep &= values <= high
+    return keep
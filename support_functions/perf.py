@@ -0,0 +1,161 @@
+"""Per-stage timings of a Streamlit rerun.
+
+Pages wrap their expensive steps in stage() or decorate them with timed().
+When enabled, every stage records its wall time, a row count and, for stages
+backed by st.cache_data, whether the call was a cache hit (the cached body
+calls cache_miss() when it actually runs). The sidebar panel shows the
+current rerun, and end_run() appends one JSON line per stage to the log.
+
+Disabled, which is the default, stage() hands back a shared no-op object and
+timed() calls straight through, so the cost is one thread-local lookup.
+Enable with RAIL_PERF=1 or per session with ?perf=1 in the URL; the log goes
+to RAIL_PERF_LOG (perf_log.jsonl).
+"""
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+
+LOG_PATH = os.environ.get("RAIL_PERF_LOG", "perf_log.jsonl")
+DEFAULT_ENABLED = os.environ.get("RAIL_PERF", "") not in ("", "0")
+
+# One script run per thread: enabled flag, finished stages and the open ones
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class Stage:
+    __slots__ = ("name", "rows", "cached", "cache_hit", "depth", "start", "ms")
+
+    def __init__(self, name, rows=None, cached=False):
+        self.name = name
+        self.rows = rows
+        self.cached = cached
+        self.cache_hit = cached
+        self.depth = 0
+        self.ms = None
+
+    def __enter__(self):
+        self.depth = len(_local.stack)
+        _local.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self.start) * 1000
+        _local.stack.pop()
+        _local.records.append(self)
+        return False
+
+    def set_rows(self, rows):
+        self.rows = rows
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "ms": round(self.ms, 3),
+            "rows": self.rows,
+            "cache_hit": self.cache_hit if self.cached else None,
+            "depth": self.depth,
+        }
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_rows(self, rows):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def enabled() -> bool:
+    return getattr(_local, "enabled", False)
+
+
+def begin_run(enabled: bool):
+    """Start collecting for this rerun (call once at the top of the script)."""
+    _local.enabled = enabled
+    _local.records = []
+    _local.stack = []
+    _local.start = time.perf_counter()
+
+
+def stage(name: str, rows=None, cached: bool = False):
+    """Context manager timing one step; `with stage(...) as s: s.set_rows(n)`."""
+    if not getattr(_local, "enabled", False):
+        return _NO_STAGE
+    return Stage(name, rows, cached)
+
+
+def cache_miss():
+    """Called from inside a cached function's body: the enclosing cached stage missed."""
+    if not getattr(_local, "enabled", False):
+        return
+    for open_stage in reversed(_local.stack):
+        if open_stage.cached:
+            open_stage.cache_hit = False
+            return
+
+
+def _row_count(result):
+    if isinstance(result, (pd.DataFrame, pd.Series, list)):
+        return len(result)
+    return None
+
+
+def timed(name: str, cached: bool = False):
+    """Decorator form of stage(); the row count is taken from a DataFrame or list result."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not getattr(_local, "enabled", False):
+                return function(*args, **kwargs)
+            with Stage(name, cached=cached) as s:
+                result = function(*args, **kwargs)
+                s.set_rows(_row_count(result))
+            return result
+        return wrapper
+    return decorate
+
+
+def records() -> list:
+    """Finished stages of this rerun in the order they started."""
+    finished = sorted(getattr(_local, "records", []), key=lambda s: s.start)
+    return [s.as_dict() for s in finished]
+
+
+def end_run(page: str = ""):
+    """Append this rerun's stages to the log and show the sidebar panel."""
+    if not enabled():
+        return
+    total_ms = (time.perf_counter() - _local.start) * 1000
+    rows = records()
+    session = st.session_state.setdefault("perf_session", uuid.uuid4().hex[:12])
+    run = {"ts": time.time(), "session": session, "page": page, "run_ms": round(total_ms, 3)}
+    try:
+        with _log_lock, open(LOG_PATH, "a") as f:
+            for row in rows:
+                f.write(json.dumps({**run, **row}) + "\n")
+    except OSError:
+        pass
+
+    with st.sidebar:
+        st.markdown(f"### ⏱️ Performance — {total_ms:.0f} ms")
+        if rows:
+            table = pd.DataFrame(rows)
+            table["stage"] = ["· " * depth + name for depth, name in zip(table["depth"], table["stage"])]
+            table["rows"] = table["rows"].astype("Int64")
+            st.dataframe(table.drop(columns="depth"), hide_index=True, use_container_width=True)
+        st.caption(f"Appended to {LOG_PATH}")
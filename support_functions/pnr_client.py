@@ -0,0 +1,389 @@
+"""PNR status lookups over one pooled HTTP session.
+
+Responses are cached per PNR: briefly while the chart is not prepared (the
+status can still change), for hours once it is. Concurrent lookups of the
+same PNR share one request. check_many() looks up a list of PNRs with asyncio,
+at most `concurrency` requests at a time, each through the same cache and
+session.
+
+A slow or failing upstream cannot hold a page for long:
+
+- timeouts, connection errors, 429 and 5xx are retried with jittered
+  exponential backoff, all within one deadline per lookup;
+- after FAILURE_THRESHOLD such failures in a row the circuit breaker fails
+  lookups fast for RESET_SECONDS, then lets a single probe through;
+- an expired response (up to STALE_TTL old) is served straight away, marked
+  stale, while a background thread refreshes it.
+
+Upstream latency and the lookups' own latency are kept as histograms, with
+counters per outcome (see PNRMetrics.snapshot).
+
+The endpoint and key come from RAIL_PNR_URL / RAIL_PNR_KEY, so the client can
+be pointed at a local stub server:
+
+    python -m support_functions.pnr_client 1234567890 2345678901 --url http://127.0.0.1:8766/getPNRStatus
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+API_HOST = "irctc-indian-railway-pnr-status.p.rapidapi.com"
+BASE_URL = os.environ.get("RAIL_PNR_URL", f"https://{API_HOST}/getPNRStatus")
+API_KEY = os.environ.get("RAIL_PNR_KEY", "bab0ed34damsh6e9ffde2dc9e481p11cafajsn8a09a681672b")
+
+# Seconds a response is reused before and after the chart is prepared
+PENDING_TTL = 120
+FINAL_TTL = 6 * 3600
+# Expired responses are still served, marked stale, for this long
+STALE_TTL = 24 * 3600
+BULK_CONCURRENCY = 8
+
+# Connect / read timeouts of one request, and the budget of a whole lookup with its retries
+CONNECT_TIMEOUT = 3
+READ_TIMEOUT = 5
+DEADLINE = 8
+RETRIES = 2
+BACKOFF_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 2
+
+FAILURE_THRESHOLD = 5
+RESET_SECONDS = 30
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open-ended
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+
+class PNRError(Exception):
+    """The PNR service could not be reached or sent back something unusable.
+
+    kind is "timeout", "connection", "http_429", "http_5xx", "http_4xx",
+    "bad_response" or "circuit_open"; retryable says whether trying again
+    soon could help.
+    """
+
+    def __init__(self, message: str, kind: str = "error", retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.kind = kind
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(PNRError):
+    def __init__(self, retry_in: float):
+        super().__init__(f"PNR service circuit open, retrying in {retry_in:.0f}s", "circuit_open")
+
+
+@dataclass
+class PNRResult:
+    data: dict
+    fetched: float  # time.time() of the response
+    stale: bool = False
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched
+
+
+@dataclass
+class _Entry:
+    data: dict
+    fetched: float
+    expires: float  # time.monotonic()
+    stale_until: float
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` failures in a row -> half-open after
+    reset_seconds, when one probe decides between closed and open again."""
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, reset_seconds: float = RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                waited = time.monotonic() - self.opened
+                if waited < self.reset_seconds:
+                    raise CircuitOpenError(self.reset_seconds - waited)
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probing:
+                    raise CircuitOpenError(0)
+                self._probing = True
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened = time.monotonic()
+
+
+class PNRMetrics:
+    """Latency histograms (upstream requests, whole lookups) and outcome counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {name: [0] * len(LATENCY_BUCKETS_MS) for name in ("upstream", "lookup")}
+        self.counters = {}
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, histogram: str, ms: float, outcome: str = None):
+        bucket = next(i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound)
+        with self._lock:
+            self.histograms[histogram][bucket] += 1
+            if outcome is not None:
+                key = f"{histogram}_{outcome}"
+                self.counters[key] = self.counters.get(key, 0) + 1
+
+    @staticmethod
+    def quantile(counts: list, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (None when empty)."""
+        total = sum(counts)
+        if not total:
+            return None
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, counts):
+            seen += n
+            if seen >= q * total:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: list(counts) for name, counts in self.histograms.items()}
+        upstream = sum(histograms["upstream"])
+        errors = upstream - counters.get("upstream_ok", 0)
+        result = {
+            "counters": counters,
+            "upstream_error_rate": round(errors / upstream, 3) if upstream else None,
+        }
+        for name, counts in histograms.items():
+            result[name] = {
+                "buckets_ms": dict(zip(map(str, LATENCY_BUCKETS_MS), counts)),
+                **{f"p{int(q * 100)}_ms": self.quantile(counts, q) for q in (0.5, 0.9, 0.99)},
+            }
+        return result
+
+
+def valid_pnr(pnr: str) -> bool:
+    return pnr.isdigit() and len(pnr) == 10
+
+
+def chart_prepared(data: dict) -> bool:
+    status = str((data.get("data") or {}).get("chartStatus") or "").lower()
+    return "prepared" in status and "not" not in status
+
+
+class PNRClient:
+    def __init__(self, base_url: str = BASE_URL, api_key: str = API_KEY,
+                 timeout: tuple = (CONNECT_TIMEOUT, READ_TIMEOUT), deadline: float = DEADLINE,
+                 retries: int = RETRIES, pending_ttl: float = PENDING_TTL, final_ttl: float = FINAL_TTL,
+                 stale_ttl: float = STALE_TTL, verify: bool = False, pool_size: int = BULK_CONCURRENCY,
+                 breaker: CircuitBreaker = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.pending_ttl = pending_ttl
+        self.final_ttl = final_ttl
+        self.stale_ttl = stale_ttl
+        self.verify = verify
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = PNRMetrics()
+        # Stale entries are refreshed here, off the page's thread
+        self._refresher = ThreadPoolExecutor(2, thread_name_prefix="pnr-refresh")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"x-rapidapi-key": api_key, "x-rapidapi-host": API_HOST})
+        # pnr -> _Entry; pnr -> Future of the request in flight
+        self._cache = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+
+    def ttl(self, data: dict) -> float:
+        return self.final_ttl if chart_prepared(data) else self.pending_ttl
+
+    def _fetch(self, pnr: str, budget: float) -> dict:
+        timeout = (min(self.timeout[0], budget), min(self.timeout[1], budget))
+        try:
+            response = self.session.get(f"{self.base_url}/{pnr}", timeout=timeout, verify=self.verify)
+        except requests.Timeout as error:
+            raise PNRError(f"PNR {pnr}: {error}", "timeout", retryable=True) from error
+        except requests.RequestException as error:
+            raise PNRError(f"PNR {pnr}: {error}", "connection", retryable=True) from error
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            kind = "http_429" if response.status_code == 429 else "http_5xx"
+            raise PNRError(f"PNR {pnr}: HTTP {response.status_code}", kind, retryable=True,
+                           retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if response.status_code >= 400:
+            raise PNRError(f"PNR {pnr}: HTTP {response.status_code}", "http_4xx")
+        try:
+            return response.json()
+        except ValueError as error:
+            raise PNRError(f"PNR {pnr}: {error}", "bad_response") from error
+
+    def _fetch_with_retries(self, pnr: str) -> dict:
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            start = time.monotonic()
+            try:
+                data = self._fetch(pnr, max(deadline - start, 0.1))
+            except PNRError as error:
+                self.metrics.observe("upstream", (time.monotonic() - start) * 1000, error.kind)
+                # Only the service's own trouble counts against it, not a bad PNR
+                if error.retryable:
+                    self.breaker.failure()
+                else:
+                    self.breaker.success()
+                if not error.retryable or attempt == self.retries:
+                    raise
+                wait = error.retry_after or random.uniform(0.5, 1) * min(BACKOFF_SECONDS * 2 ** attempt, BACKOFF_MAX_SECONDS)
+                if time.monotonic() + wait >= deadline:
+                    raise
+                self.metrics.count("retries")
+                time.sleep(wait)
+            else:
+                self.metrics.observe("upstream", (time.monotonic() - start) * 1000, "ok")
+                self.breaker.success()
+                return data
+
+    def _resolve(self, pnr: str, future: Future) -> _Entry:
+        """Fetch pnr for everyone waiting on future, and cache the response."""
+        try:
+            data = self._fetch_with_retries(pnr)
+        except PNRError as error:
+            future.set_exception(error)
+            raise
+        else:
+            now = time.monotonic()
+            entry = _Entry(data, time.time(), now + self.ttl(data), now + self.stale_ttl)
+            with self._lock:
+                self._cache[pnr] = entry
+            future.set_result(entry)
+            return entry
+        finally:
+            with self._lock:
+                self._in_flight.pop(pnr, None)
+
+    def _refresh(self, pnr: str, future: Future):
+        try:
+            self._resolve(pnr, future)
+        except PNRError as error:
+            self.metrics.count(f"refresh_{error.kind}")
+
+    def lookup(self, pnr: str) -> PNRResult:
+        """The service's JSON for pnr with its age; raises PNRError when there is none to give.
+
+        A fresh cached response is returned as is; an expired one is returned
+        marked stale while a background refresh runs. Otherwise the lookup
+        waits for the request (its own or a concurrent one for the same PNR).
+        """
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            with self._lock:
+                entry = self._cache.get(pnr)
+                if entry is not None and entry.stale_until <= start:
+                    entry = None
+                if entry is not None and entry.expires > start:
+                    outcome = "cache_hit"
+                    return PNRResult(entry.data, entry.fetched)
+                future = self._in_flight.get(pnr)
+                owner = future is None
+                if owner:
+                    future = self._in_flight[pnr] = Future()
+                    self.requests_sent += 1
+
+            if entry is not None:
+                if owner:
+                    self._refresher.submit(self._refresh, pnr, future)
+                outcome = "stale"
+                return PNRResult(entry.data, entry.fetched, stale=True)
+
+            if owner:
+                entry = self._resolve(pnr, future)
+                outcome = "ok"
+            else:
+                entry = future.result()
+                outcome = "coalesced"
+            return PNRResult(entry.data, entry.fetched)
+        except PNRError as error:
+            outcome = error.kind
+            raise
+        finally:
+            self.metrics.observe("lookup", (time.monotonic() - start) * 1000, outcome)
+
+    def get(self, pnr: str) -> dict:
+        """The service's JSON for pnr, possibly stale (see lookup); raises PNRError."""
+        return self.lookup(pnr).data
+
+    async def get_many(self, pnrs, concurrency: int = BULK_CONCURRENCY) -> dict:
+        """pnr -> PNRResult or PNRError for each PNR, at most `concurrency` requests at a time."""
+        loop = asyncio.get_running_loop()
+        limit = asyncio.Semaphore(concurrency)
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            async def one(pnr):
+                async with limit:
+                    try:
+                        return pnr, await loop.run_in_executor(pool, self.lookup, pnr)
+                    except PNRError as error:
+                        return pnr, error
+
+            pnrs = list(dict.fromkeys(pnrs))
+            return dict(await asyncio.gather(*(one(pnr) for pnr in pnrs)))
+
+    def check_many(self, pnrs, concurrency: int = BULK_CONCURRENCY) -> dict:
+        """Blocking form of get_many() for scripts and Streamlit pages."""
+        return asyncio.run(self.get_many(pnrs, concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pnrs", nargs="+")
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY)
+    args = parser.parse_args()
+
+    client = PNRClient(args.url, pool_size=args.concurrency)
+    start = time.perf_counter()
+    results = client.check_many(args.pnrs, args.concurrency)
+    for pnr, result in results.items():
+        print(json.dumps({"pnr": pnr, "error": str(result)} if isinstance(result, Exception) else result.data))
+    print(json.dumps({"pnrs": len(results), "requests": client.requests_sent,
+                      "seconds": round(time.perf_counter() - start, 3), "metrics": client.metrics.snapshot()}),
+          file=sys.stderr)
@@ -0,0 +1,262 @@
+"""Binary snapshots of the database/ CSVs for fast cold starts.
+
+Each CSV is compiled to an uncompressed Arrow IPC (Feather) file, and schedules
+additionally to a StopTimes .npz, under database/.snapshot/. Arrow needs no
+decode step on read, which makes it faster to load than Parquet. A manifest
+records the source file's size, mtime and SHA-1; a snapshot is used only while
+those still match, so editing a CSV invalidates it automatically.
+
+    python -m support_functions.snapshot compile
+    python -m support_functions.snapshot benchmark
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from support_functions.stop_times import StopTimes, build_stop_times
+
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_DIR = ".snapshot"
+MANIFEST = "manifest.json"
+SCHEDULE_FILES = ["reserved_train_schedule.csv", "unreserved_train_schedule.csv"]
+TABLE_FILES = ["master_list.csv", "station_index_with_coords.csv"]
+
+
+def file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _snapshot_root(csv_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), SNAPSHOT_DIR)
+
+
+def _snapshot_path(csv_path: str, suffix: str) -> str:
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(_snapshot_root(csv_path), stem + suffix)
+
+
+def _read_manifest(root: str) -> dict:
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_atomic(path: str, write):
+    """Call write(tmp) on a temporary path next to path, then move it into place with os.replace."""
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _write_manifest(root: str, manifest: dict):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    write_atomic(os.path.join(root, MANIFEST), write)
+
+
+def _is_fresh(csv_path: str, files: list) -> bool:
+    """True if the snapshot files exist and were compiled from the current CSV."""
+    root = _snapshot_root(csv_path)
+    manifest = _read_manifest(root)
+    entry = manifest.get(os.path.basename(csv_path))
+    if not entry or entry.get("version") != SNAPSHOT_VERSION:
+        return False
+    if not all(os.path.exists(_snapshot_path(csv_path, suffix)) for suffix in files):
+        return False
+
+    stat = os.stat(csv_path)
+    if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return True
+    # mtime moved (e.g. fresh checkout): only the content hash decides
+    if entry["size"] != stat.st_size or entry["sha1"] != file_sha1(csv_path):
+        return False
+    entry["mtime_ns"] = stat.st_mtime_ns
+    try:
+        _write_manifest(root, manifest)
+    except OSError:
+        pass
+    return True
+
+
+def _record(csv_path: str, files: list):
+    root = _snapshot_root(csv_path)
+    manifest = _read_manifest(root)
+    stat = os.stat(csv_path)
+    manifest[os.path.basename(csv_path)] = {
+        "version": SNAPSHOT_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha1": file_sha1(csv_path),
+        "files": files,
+    }
+    _write_manifest(root, manifest)
+
+
+def save_stop_times(path: str, stop_times: StopTimes):
+    name_codes, names = pd.factorize(stop_times.stop_name)
+    # Only the cells of missing times are kept; NaN and the None elsewhere share code -1
+    arr_text_codes, arr_texts = pd.factorize(stop_times.arr_text)
+    dep_text_codes, dep_texts = pd.factorize(stop_times.dep_text)
+
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                train_numbers=stop_times.train_numbers.astype(str),
+                train_index=stop_times.train_index,
+                offsets=stop_times.offsets,
+                station_codes=stop_times.station_codes.astype(str),
+                station_id=stop_times.station_id,
+                stop_name_codes=name_codes.astype(np.int32),
+                stop_names=np.asarray(names, dtype=str),
+                arr=stop_times.arr,
+                dep=stop_times.dep,
+                day=stop_times.day,
+                dist=stop_times.dist,
+                arr_text_codes=arr_text_codes.astype(np.int32),
+                arr_texts=np.asarray(arr_texts, dtype=str),
+                dep_text_codes=dep_text_codes.astype(np.int32),
+                dep_texts=np.asarray(dep_texts, dtype=str),
+            )
+    write_atomic(path, write)
+
+
+def _text_column(codes: np.ndarray, texts: np.ndarray) -> np.ndarray:
+    # Code -1 picks the trailing NaN, a missing cell as build_timetable printed it
+    return np.append(texts.astype(object), np.nan)[codes]
+
+
+def load_stop_times(path: str) -> StopTimes:
+    with np.load(path) as npz:
+        names = npz["stop_names"].astype(object)
+        return StopTimes(
+            train_numbers=npz["train_numbers"].astype(object),
+            train_index=npz["train_index"],
+            offsets=npz["offsets"],
+            station_codes=npz["station_codes"].astype(object),
+            station_id=npz["station_id"],
+            stop_name=names[npz["stop_name_codes"]],
+            arr=npz["arr"],
+            dep=npz["dep"],
+            day=npz["day"],
+            dist=npz["dist"],
+            arr_text=_text_column(npz["arr_text_codes"], npz["arr_texts"]),
+            dep_text=_text_column(npz["dep_text_codes"], npz["dep_texts"]),
+        )
+
+
+def read_table(csv_path: str, use_snapshot: bool = True) -> pd.DataFrame:
+    """pd.read_csv(csv_path, low_memory=False), served from the Arrow snapshot when fresh."""
+    arrow = _snapshot_path(csv_path, ".arrow")
+    if use_snapshot and _is_fresh(csv_path, [".arrow"]):
+        return pd.read_feather(arrow)
+
+    df = pd.read_csv(csv_path, low_memory=False)
+    if use_snapshot:
+        try:
+            os.makedirs(_snapshot_root(csv_path), exist_ok=True)
+            write_atomic(arrow, lambda tmp: df.to_feather(tmp, compression="uncompressed"))
+            _record(csv_path, [".arrow"])
+        except Exception:
+            # Read-only checkout or a column pyarrow can't type: keep serving from CSV
+            pass
+    return df
+
+
+def read_schedule(csv_path: str, use_snapshot: bool = True):
+    """Wide schedule frame plus its StopTimes, from snapshot when fresh."""
+    files = [".arrow", ".stop_times.npz"]
+    if use_snapshot and _is_fresh(csv_path, files):
+        train_df = pd.read_feather(_snapshot_path(csv_path, ".arrow"))
+        return train_df, load_stop_times(_snapshot_path(csv_path, ".stop_times.npz"))
+
+    train_df = pd.read_csv(csv_path, low_memory=False)
+    stop_times = build_stop_times(train_df)
+    if use_snapshot:
+        try:
+            os.makedirs(_snapshot_root(csv_path), exist_ok=True)
+            write_atomic(_snapshot_path(csv_path, ".arrow"), lambda tmp: train_df.to_feather(tmp, compression="uncompressed"))
+            save_stop_times(_snapshot_path(csv_path, ".stop_times.npz"), stop_times)
+            _record(csv_path, files)
+        except Exception:
+            pass
+    return train_df, stop_times
+
+
+def compile_snapshots(database_dir: str):
+    """Rebuild every snapshot under database_dir/.snapshot from the CSVs."""
+    for name in TABLE_FILES + SCHEDULE_FILES:
+        path = os.path.join(database_dir, name)
+        if not os.path.exists(path):
+            print(f"skip {name}: not found")
+            continue
+        manifest = _read_manifest(_snapshot_root(path))
+        manifest.pop(name, None)
+        os.makedirs(_snapshot_root(path), exist_ok=True)
+        _write_manifest(_snapshot_root(path), manifest)
+
+        start = time.perf_counter()
+        if name in SCHEDULE_FILES:
+            read_schedule(path)
+        else:
+            read_table(path)
+        fresh = _is_fresh(path, _read_manifest(_snapshot_root(path)).get(name, {}).get("files", [".arrow"]))
+        status = "ok" if fresh else "FAILED (served from CSV)"
+        print(f"{name}: {status} in {time.perf_counter() - start:.2f}s")
+
+
+def benchmark(database_dir: str, repeat: int = 3) -> pd.DataFrame:
+    """Best-of-`repeat` load time per file, CSV (plus StopTimes build) vs snapshot."""
+    rows = []
+    for name in TABLE_FILES + SCHEDULE_FILES:
+        path = os.path.join(database_dir, name)
+        if not os.path.exists(path):
+            continue
+        reader = read_schedule if name in SCHEDULE_FILES else read_table
+        reader(path)  # make sure the snapshot exists
+        timings = {}
+        for label, use_snapshot in (("csv_s", False), ("snapshot_s", True)):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                reader(path, use_snapshot=use_snapshot)
+                best = min(best, time.perf_counter() - start)
+            timings[label] = best
+        rows.append({"file": name, **timings, "speedup": timings["csv_s"] / timings["snapshot_s"]})
+
+    result = pd.DataFrame(rows)
+    if not result.empty:
+        total = {"file": "TOTAL", "csv_s": result["csv_s"].sum(), "snapshot_s": result["snapshot_s"].sum()}
+        total["speedup"] = total["csv_s"] / total["snapshot_s"]
+        result = pd.concat([result, pd.DataFrame([total])], ignore_index=True)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["compile", "benchmark"])
+    parser.add_argument("--database", default=os.path.join(os.getcwd(), "database"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        compile_snapshots(args.database)
+    else:
+        print(benchmark(args.database, args.repeat).to_string(index=False, float_format="%.3f"))
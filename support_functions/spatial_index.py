@@ -0,0 +1,219 @@
+"""Nearest-station, radius and bounding-box queries over station coordinates.
+
+StationKDTree splits the stations with coordinates at the median of the
+wider axis until at most LEAF_SIZE remain, like a k-d tree, and keeps the
+leaves as contiguous ranges of the reordered arrays. Every query then scores
+all leaves at once with NumPy instead of walking the nodes in Python:
+
+- a lower bound on the distance from the query to anything in the leaf's
+  lat/lon box prunes leaves;
+- an upper bound (distance to the leaf's centre plus its radius) gives the
+  k-nearest search its cut-off without a first pass.
+
+Distances are great-circle km (haversine), and batches of coordinates are
+answered together.
+
+nearby_trains() combines the hits with StopTimes' station postings for the
+"trains from stations near me" search.
+"""
+import numpy as np
+import pandas as pd
+
+from support_functions.stop_times import StopTimes, format_hhmm
+
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 16
+# Queries scored against the leaves per NumPy pass
+QUERY_CHUNK = 2048
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; the arguments broadcast like NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, end) for each pair, without a Python loop."""
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths)
+
+
+class StationKDTree:
+    def __init__(self, codes, names, lat, lon, leaf_size: int = LEAF_SIZE):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        order = np.arange(len(lat))
+        leaves = []
+        parts = [order]
+        # Median splits on the wider side (longitude scaled to km at that latitude)
+        while parts:
+            part = parts.pop()
+            if len(part) <= leaf_size:
+                # No stations with coordinates leaves no leaves, and zero-length leaf arrays
+                if len(part):
+                    leaves.append(part)
+                continue
+            lat_span = np.ptp(lat[part])
+            lon_span = np.ptp(lon[part]) * np.cos(np.radians(np.mean(lat[part])))
+            axis = lat if lat_span >= lon_span else lon
+            half = len(part) // 2
+            split = part[np.argpartition(axis[part], half)]
+            parts += [split[half:], split[:half]]
+
+        order = np.concatenate(leaves) if leaves else order
+        self.codes = np.asarray(codes, dtype=object)[order]
+        self.names = np.asarray(names, dtype=object)[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        sizes = np.array([len(leaf) for leaf in leaves], dtype=np.int64)
+        self.leaf_end = np.cumsum(sizes)
+        self.leaf_start = self.leaf_end - sizes
+        self.leaf_size = sizes
+
+        n_leaves = len(leaves)
+        self.box_lat = np.empty((n_leaves, 2))
+        self.box_lon = np.empty((n_leaves, 2))
+        self.center_lat = np.empty(n_leaves)
+        self.center_lon = np.empty(n_leaves)
+        self.radius = np.empty(n_leaves)
+        for leaf, (start, end) in enumerate(zip(self.leaf_start, self.leaf_end)):
+            leaf_lat, leaf_lon = self.lat[start:end], self.lon[start:end]
+            self.box_lat[leaf] = leaf_lat.min(), leaf_lat.max()
+            self.box_lon[leaf] = leaf_lon.min(), leaf_lon.max()
+            self.center_lat[leaf] = leaf_lat.mean()
+            self.center_lon[leaf] = leaf_lon.mean()
+            self.radius[leaf] = haversine_km(self.center_lat[leaf], self.center_lon[leaf], leaf_lat, leaf_lon).max()
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+
+    @classmethod
+    def from_station_df(cls, station_df: pd.DataFrame, leaf_size: int = LEAF_SIZE) -> "StationKDTree":
+        """Stations of station_index_with_coords.csv that have coordinates, first row per code."""
+        known = station_df.dropna(subset=["Latitude", "Longitude"]).drop_duplicates(subset="stationCode")
+        return cls(known["stationCode"].astype(str).str.upper(), known["stationName"],
+                   known["Latitude"], known["Longitude"], leaf_size)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def _lower_bound(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """queries x leaves: no point of the leaf is closer than this (km).
+
+        hav(d) = hav(dlat) + cos(lat1) cos(lat2) hav(dlon), and each term is at
+        least its smallest value over the leaf's box.
+        """
+        lat = np.radians(lat)[:, None]
+        lon = np.radians(lon)[:, None]
+        lat_lo, lat_hi = np.radians(self.box_lat).T
+        lon_lo, lon_hi = np.radians(self.box_lon).T
+        dlat = np.maximum(np.maximum(lat_lo - lat, lat - lat_hi), 0)
+        dlon = np.maximum(np.maximum(lon_lo - lon, lon - lon_hi), 0)
+        min_cos = np.minimum(np.cos(lat_lo), np.cos(lat_hi))
+        h = np.sin(dlat / 2) ** 2 + np.cos(lat) * min_cos * np.sin(dlon / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+    def _candidates(self, lat: np.ndarray, lon: np.ndarray, leaf_mask: np.ndarray):
+        """(query, point, km) for every point in the leaves leaf_mask selects per query."""
+        query, leaf = np.nonzero(leaf_mask)
+        sizes = self.leaf_size[leaf]
+        points = _ranges(self.leaf_start[leaf], self.leaf_end[leaf])
+        query = np.repeat(query, sizes)
+        return query, points, haversine_km(lat[query], lon[query], self.lat[points], self.lon[points])
+
+    def query(self, lat, lon, k: int = 1):
+        """(km, index) arrays of shape (n_queries, k): the k nearest stations per coordinate."""
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        k = min(k, len(self))
+        distances = np.empty((len(lat), k))
+        indices = np.empty((len(lat), k), dtype=np.int64)
+        if not k:
+            return distances, indices
+        for start in range(0, len(lat), QUERY_CHUNK):
+            part = slice(start, start + QUERY_CHUNK)
+            distances[part], indices[part] = self._query_chunk(lat[part], lon[part], k)
+        return distances, indices
+
+    def _query_chunk(self, lat, lon, k):
+        n = len(lat)
+        # Cut-off: the smallest upper bound that already covers k stations
+        upper = haversine_km(lat[:, None], lon[:, None], self.center_lat, self.center_lon) + self.radius
+        by_upper = np.argsort(upper, axis=1)
+        covered = np.cumsum(self.leaf_size[by_upper], axis=1)
+        enough = np.argmax(covered >= k, axis=1)
+        cutoff = upper[np.arange(n), by_upper[np.arange(n), enough]]
+
+        query, points, km = self._candidates(lat, lon, self._lower_bound(lat, lon) <= cutoff[:, None])
+        ranked = np.lexsort((km, query))
+        query, points, km = query[ranked], points[ranked], km[ranked]
+        rank = np.arange(len(query)) - np.searchsorted(query, query)
+        top = rank < k
+        return km[top].reshape(n, k), points[top].reshape(n, k)
+
+    def query_radius(self, lat, lon, radius_km: float) -> list:
+        """Per coordinate, (km, index) of the stations within radius_km, nearest first."""
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        results = []
+        for start in range(0, len(lat), QUERY_CHUNK):
+            part_lat, part_lon = lat[start:start + QUERY_CHUNK], lon[start:start + QUERY_CHUNK]
+            query, points, km = self._candidates(part_lat, part_lon, self._lower_bound(part_lat, part_lon) <= radius_km)
+            inside = km <= radius_km
+            query, points, km = query[inside], points[inside], km[inside]
+            ranked = np.lexsort((km, query))
+            bounds = np.searchsorted(query[ranked], np.arange(len(part_lat) + 1))
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                results.append((km[ranked[lo:hi]], points[ranked[lo:hi]]))
+        return results
+
+    def query_box(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> np.ndarray:
+        """Indices of the stations inside the bounding box."""
+        overlaps = ((self.box_lat[:, 0] <= lat_max) & (self.box_lat[:, 1] >= lat_min)
+                    & (self.box_lon[:, 0] <= lon_max) & (self.box_lon[:, 1] >= lon_min))
+        points = _ranges(self.leaf_start[overlaps], self.leaf_end[overlaps])
+        inside = ((self.lat[points] >= lat_min) & (self.lat[points] <= lat_max)
+                  & (self.lon[points] >= lon_min) & (self.lon[points] <= lon_max))
+        return points[inside]
+
+    def stations(self, index, km=None) -> pd.DataFrame:
+        """Station rows for query results, with the distance when given."""
+        index = np.asarray(index)
+        frame = pd.DataFrame({
+            "Station Code": self.codes[index],
+            "Station Name": self.names[index],
+            "Latitude": self.lat[index],
+            "Longitude": self.lon[index],
+        })
+        if km is not None:
+            frame["Distance (km)"] = np.round(km, 1)
+        return frame
+
+
+def nearby_trains(tree: StationKDTree, stop_times: StopTimes, train_summary: pd.DataFrame,
+                  lat: float, lon: float, radius_km: float) -> pd.DataFrame:
+    """Trains calling at any station within radius_km, each at its nearest such station.
+
+    Rows are train_summary's, nearest station first, with the station, its
+    distance and the train's times there.
+    """
+    km, points = tree.query_radius(lat, lon, radius_km)[0]
+    sids = np.array([stop_times.station_lookup.get(code, -1) for code in tree.codes[points]], dtype=np.int64)
+    served = sids >= 0
+    km, sids = km[served], sids[served]
+
+    # All calls at those stations from the postings, already nearest station first
+    starts, ends = stop_times.posting_offsets[sids], stop_times.posting_offsets[sids + 1]
+    stops = stop_times.posting_stops[_ranges(starts, ends)]
+    stop_km = np.repeat(km, ends - starts)
+    _, first = np.unique(stop_times.stop_train[stops], return_index=True)
+    first = first[np.argsort(stop_km[first], kind="stable")]
+    stops, stop_km = stops[first], stop_km[first]
+
+    nearby = train_summary.loc[stop_times.stop_train[stops]].copy()
+    nearby.insert(0, "Km Away", np.round(stop_km, 1))
+    nearby.insert(0, "Nearby Station", stop_times.station_codes[stop_times.station_id[stops]])
+    nearby.insert(2, "Departure There", format_hhmm(stop_times.dep[stops]))
+    return nearby
@@ -0,0 +1,177 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from support_functions import perf
+
+
+TOKEN = re.compile(r"[A-Z0-9]+")
+NO_MATCH = np.iinfo(np.int16).max
+PLACEHOLDER = "Type a station code or name"
+
+
+def tokenize(text: str) -> list:
+    return TOKEN.findall(str(text).upper())
+
+
+def max_typos(token: str) -> int:
+    """Edits allowed when fuzzy-matching a query token of this length."""
+    if len(token) <= 2:
+        return 0
+    return 1 if len(token) <= 4 else 2
+
+
+def prefix_edit_distance(query: str, tokens: np.ndarray, lengths: np.ndarray, limit: int) -> np.ndarray:
+    """Levenshtein distance from query to the closest prefix of each token.
+
+    tokens is a (n, width) array of character codes padded with zeros. Prefixes
+    longer than len(query) + limit can't be within limit, so the DP stops there.
+    Distances above limit are reported as NO_MATCH.
+    """
+    n = len(tokens)
+    width = min(tokens.shape[1], len(query) + limit)
+    codes = np.frombuffer(query.encode("utf-32-le"), dtype=np.uint32)
+    row = np.tile(np.arange(width + 1, dtype=np.int16), (n, 1))
+    for i, char in enumerate(codes, start=1):
+        prev, row = row, np.empty_like(row)
+        row[:, 0] = i
+        for j in range(1, width + 1):
+            substitute = prev[:, j - 1] + (tokens[:, j - 1] != char)
+            row[:, j] = np.minimum(np.minimum(prev[:, j], row[:, j - 1]) + 1, substitute)
+    # Only prefixes that exist in the token count
+    valid = np.arange(width + 1) <= lengths[:, None]
+    best = np.where(valid, row, NO_MATCH).min(axis=1)
+    return np.where(best <= limit, best, NO_MATCH).astype(np.int16)
+
+
+class StationSearch:
+    """Ranked lookup over station_df's "CODE - NAME" labels.
+
+    A query matches a station by code prefix, or when every query token is a
+    prefix of some word of the name, allowing a few typos per token for longer
+    tokens ("VIZAG" finds "VIZIANAGRAM JN"). Ranking: exact code, code prefix,
+    then name matches by total typos, longest prefix shared with the query,
+    names starting with the first token, and shorter names.
+    """
+
+    def __init__(self, station_df: pd.DataFrame):
+        stations = station_df.dropna(subset=["stationCode", "stationName"])
+        self.codes = stations["stationCode"].astype(str).str.upper().to_numpy()
+        self.names = stations["stationName"].astype(str).str.upper().to_numpy()
+        self.labels = stations["label"].astype(str).to_numpy()
+        self.label_to_code = dict(zip(self.labels, self.codes))
+        self.code_to_label = dict(zip(self.codes, self.labels))
+        self.n_stations = len(self.codes)
+
+        self.code_order = np.argsort(self.codes, kind="stable")
+        self.sorted_codes = self.codes[self.code_order].astype(str)
+
+        # Station -> name words, flattened; each station's words are contiguous
+        words = [tokenize(name) or [""] for name in self.names]
+        self.word_offsets = np.zeros(self.n_stations + 1, dtype=np.int64)
+        np.cumsum([len(w) for w in words], out=self.word_offsets[1:])
+        flat = np.array([word for w in words for word in w], dtype=str)
+        self.vocabulary, self.word_ids = np.unique(flat, return_inverse=True)
+
+        # Distinct words as a zero-padded character-code matrix, sorted so
+        # that all words sharing a first letter form one contiguous block
+        self.word_lengths = np.char.str_len(self.vocabulary)
+        width = max(int(self.word_lengths.max(initial=1)), 1)
+        self.word_chars = (
+            np.frombuffer(self.vocabulary.astype(f"<U{width}").tobytes(), dtype=np.uint32)
+            .reshape(len(self.vocabulary), width)
+        )
+        self.name_lengths = np.char.str_len(self.names.astype(str))
+
+    def code(self, label):
+        return self.label_to_code.get(label)
+
+    def labels_for(self, codes) -> list:
+        return [self.code_to_label[code] for code in codes if code in self.code_to_label]
+
+    def _code_prefix(self, query: str) -> np.ndarray:
+        lo = np.searchsorted(self.sorted_codes, query, side="left")
+        hi = np.searchsorted(self.sorted_codes, query + "\uffff", side="left")
+        return self.code_order[lo:hi]
+
+    def _common_prefix(self, token: str) -> np.ndarray:
+        """Per-vocabulary-word length of the prefix shared with token."""
+        width = min(len(token), self.word_chars.shape[1])
+        codes = np.frombuffer(token[:width].encode("utf-32-le"), dtype=np.uint32)
+        return np.cumprod(self.word_chars[:, :width] == codes, axis=1).sum(axis=1)
+
+    def _word_distance(self, token: str) -> np.ndarray:
+        """Per-vocabulary-word prefix edit distance to token (NO_MATCH if too far)."""
+        distance = np.full(len(self.vocabulary), NO_MATCH, dtype=np.int16)
+        # Typos in the first letter are rare; only words sharing it are scored
+        lo = np.searchsorted(self.vocabulary, token[0], side="left")
+        hi = np.searchsorted(self.vocabulary, token[0] + "\uffff", side="left")
+        distance[lo:hi] = prefix_edit_distance(
+            token, self.word_chars[lo:hi], self.word_lengths[lo:hi], max_typos(token)
+        )
+        return distance
+
+    def search(self, query: str, k: int = 10, exclude=None, allowed=None) -> list:
+        """Top-k station labels for query, best first.
+
+        exclude drops one label; allowed, if given, limits hits to those codes.
+        """
+        query = str(query).strip().upper()
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # Name score: summed typos over query tokens, each taking its best word;
+        # among equal typos, longer exact prefixes shared with the query win
+        typos = np.zeros(self.n_stations, dtype=np.int32)
+        shared = np.zeros(self.n_stations, dtype=np.int32)
+        first_word = np.zeros(self.n_stations, dtype=bool)
+        starts = self.word_offsets[:-1]
+        for n, token in enumerate(tokens):
+            distance = self._word_distance(token)[self.word_ids]
+            typos += np.minimum.reduceat(distance, starts)
+            shared += np.maximum.reduceat(self._common_prefix(token)[self.word_ids], starts)
+            if n == 0:
+                first_word = distance[starts] == 0
+        name_match = typos < NO_MATCH
+
+        # Tiers: 0 exact code, 1 code prefix, 2 name match
+        tier = np.where(name_match, 2, 3)
+        tier[self._code_prefix(query)] = 1
+        tier[(self.codes == query) | (self.labels == query)] = 0
+        hits = np.flatnonzero(tier < 3)
+        if exclude is not None:
+            hits = hits[self.labels[hits] != exclude]
+        if allowed is not None:
+            hits = hits[np.isin(self.codes[hits], np.asarray(allowed, dtype=object))]
+
+        order = np.lexsort((
+            self.labels[hits],
+            self.name_lengths[hits],
+            ~first_word[hits],
+            -shared[hits],
+            np.where(tier[hits] == 2, typos[hits], 0),
+            tier[hits],
+        ))
+        return self.labels[hits[order[:k]]].tolist()
+
+    @perf.timed("station_options")
+    def options(self, query: str, selected=None, exclude=None, k: int = 20, allowed=None) -> list:
+        """Selectbox options for query: the top-k hits, keeping the current selection.
+
+        With allowed (codes, in order of preference) the options are limited to
+        those stations, and an empty query offers the first k of them.
+        """
+        if query:
+            hits = self.search(query, k, exclude=exclude, allowed=allowed)
+        elif allowed is not None:
+            hits = [label for label in self.labels_for(allowed) if label != exclude][:k]
+        else:
+            hits = []
+        keep = selected is not None and selected != exclude and selected in self.label_to_code
+        if keep and allowed is not None:
+            keep = self.label_to_code[selected] in set(allowed)
+        if keep and selected not in hits:
+            hits.insert(0, selected)
+        return hits
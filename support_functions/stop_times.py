@@ -0,0 +1,317 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+
+STATION_CODE_COL = re.compile(r"^station(\d+)_code$")
+MISSING_TIME = -1
+MISSING_DIST = -1
+# Shown for a missing time when the schedule's own cell text isn't known
+MISSING_TEXT = "--"
+
+
+def station_slot_count(train_df: pd.DataFrame) -> int:
+    """Number of station{i}_* column groups present in a wide schedule frame."""
+    slots = [int(m.group(1)) for m in map(STATION_CODE_COL.match, train_df.columns) if m]
+    return max(slots, default=0)
+
+
+def parse_hhmm(values: np.ndarray) -> np.ndarray:
+    """Convert "HH:MM" strings to int16 minutes since midnight.
+
+    -1 (MISSING_TIME) for "--", marker text such as "Start", out-of-range
+    times such as "24:10" and missing cells.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+    lookup = np.full(len(uniques) + 1, MISSING_TIME, dtype=np.int16)
+    for i, value in enumerate(uniques):
+        hh, sep, mm = str(value).partition(":")
+        if sep and hh.isdigit() and mm.isdigit() and int(hh) < 24 and int(mm) < 60:
+            lookup[i] = int(hh) * 60 + int(mm)
+    # factorize marks NaN with -1, which picks the trailing MISSING_TIME slot
+    return lookup[codes]
+
+
+# Index -1 (MISSING_TIME) wraps around to the trailing "--"
+HHMM_TEXT = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)] + [MISSING_TEXT], dtype=object)
+
+
+def format_hhmm(minutes: np.ndarray) -> np.ndarray:
+    """Inverse of parse_hhmm: "HH:MM" strings, "--" where the time is missing."""
+    return HHMM_TEXT[np.asarray(minutes, dtype=np.int32)]
+
+
+def missing_time_text(values: np.ndarray, minutes: np.ndarray) -> np.ndarray:
+    """The raw cells parse_hhmm turned into MISSING_TIME ("Start", "End", NaN ...); None elsewhere."""
+    values = np.asarray(values, dtype=object)
+    return np.where(minutes == MISSING_TIME, values, None)
+
+
+def format_schedule_time(minutes: np.ndarray, text: np.ndarray) -> np.ndarray:
+    """format_hhmm, with the schedule's own cell text where the time is missing."""
+    formatted = format_hhmm(minutes)
+    missing = np.asarray(minutes) == MISSING_TIME
+    formatted[missing] = text[missing]
+    return formatted
+
+
+def journey_minutes(dep, dep_day, arr, arr_day):
+    """Minutes from a departure to a later arrival, as the search pages compute it.
+
+    Mirrors the strptime arithmetic: both times are shifted by their day counter
+    and an arrival that still lands before the departure gets one extra day.
+    Returns (minutes, valid) where valid is False if either time is missing.
+    """
+    dep = np.asarray(dep, dtype=np.int32)
+    arr = np.asarray(arr, dtype=np.int32)
+    total = (arr + np.asarray(arr_day, dtype=np.int32) * 1440) - (dep + np.asarray(dep_day, dtype=np.int32) * 1440)
+    total = np.where(total < 0, total + 1440, total)
+    valid = (dep != MISSING_TIME) & (arr != MISSING_TIME)
+    return total, valid
+
+
+def format_duration(minutes, valid) -> np.ndarray:
+    """"{h}h {m}m" strings, "-" where not valid."""
+    valid = np.broadcast_to(valid, np.shape(minutes))
+    return np.array(
+        [f"{m // 60}h {m % 60}m" if ok else "-" for m, ok in zip(np.asarray(minutes).tolist(), valid.tolist())],
+        dtype=object,
+    )
+
+
+def dash_where_invalid(values, valid) -> pd.Series:
+    """values with "-" in the invalid slots; stays numeric if nothing is invalid."""
+    values = pd.Series(values)
+    return values if np.all(valid) else values.astype(object).where(valid, "-")
+
+
+@dataclass
+class StopTimes:
+    """Long-format schedule: one entry per (train, stop_seq) in contiguous arrays.
+
+    Stops of train ``t`` live in ``[offsets[t], offsets[t + 1])``. Times are minutes
+    since midnight, ``day`` is the schedule's day counter (1 = origin day) and
+    ``dist`` is the cumulative distance in km.
+    """
+    train_numbers: np.ndarray   # str, one per train
+    train_index: np.ndarray     # train_df index label of each train
+    offsets: np.ndarray         # int64, n_trains + 1
+    station_codes: np.ndarray   # str, station id -> code
+    station_id: np.ndarray      # int32, per stop
+    stop_name: np.ndarray       # str, per stop (names as printed in the schedule)
+    arr: np.ndarray             # int16, per stop
+    dep: np.ndarray             # int16, per stop
+    day: np.ndarray             # int8, per stop
+    dist: np.ndarray            # int32, per stop
+    # Raw arr/dep cells where the time is MISSING_TIME (see missing_time_text); MISSING_TEXT if not given
+    arr_text: np.ndarray = None
+    dep_text: np.ndarray = None
+    stop_train: np.ndarray = field(init=False)
+    stop_seq: np.ndarray = field(init=False)
+    posting_offsets: np.ndarray = field(init=False)
+    posting_stops: np.ndarray = field(init=False)
+    station_lookup: dict = field(init=False)
+    train_lookup: dict = field(init=False)
+    fingerprint: str = field(init=False)
+
+    def __post_init__(self):
+        if self.arr_text is None:
+            self.arr_text = np.full(len(self.arr), MISSING_TEXT, dtype=object)
+        if self.dep_text is None:
+            self.dep_text = np.full(len(self.dep), MISSING_TEXT, dtype=object)
+        lengths = np.diff(self.offsets)
+        self.stop_train = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        self.stop_seq = (np.arange(len(self.station_id)) - self.offsets[self.stop_train]).astype(np.int16)
+
+        # Inverted index: station id -> global stop indices, ordered by (train, stop_seq)
+        self.posting_stops = np.argsort(self.station_id, kind="stable").astype(np.int32)
+        self.posting_offsets = np.zeros(len(self.station_codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.station_id, minlength=len(self.station_codes)), out=self.posting_offsets[1:])
+
+        self.station_lookup = {code: i for i, code in enumerate(self.station_codes)}
+        self.train_lookup = {number: i for i, number in enumerate(self.train_numbers)}
+
+        digest = hashlib.sha1("\n".join(self.train_numbers).encode())
+        for arr in (self.offsets, self.station_id, self.arr, self.dep, self.day, self.dist):
+            digest.update(np.ascontiguousarray(arr).tobytes())
+        digest.update("\n".join(self.station_codes).encode())
+        self.fingerprint = digest.hexdigest()[:16]
+
+    @property
+    def n_trains(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_stations(self) -> int:
+        return len(self.station_codes)
+
+    @property
+    def n_stops(self) -> int:
+        return len(self.station_id)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            arr.nbytes for arr in (
+                self.offsets, self.station_id, self.arr, self.dep, self.day,
+                self.dist, self.stop_train, self.stop_seq,
+                self.posting_offsets, self.posting_stops,
+            )
+        )
+
+    def stops(self, train: int) -> slice:
+        """Slice into the per-stop arrays for one train id."""
+        return slice(self.offsets[train], self.offsets[train + 1])
+
+    def station_stops(self, code: str) -> np.ndarray:
+        """Global stop indices at a station code, ordered by (train, stop_seq)."""
+        sid = self.station_lookup.get(code)
+        if sid is None:
+            return np.empty(0, dtype=np.int32)
+        return self.posting_stops[self.posting_offsets[sid]:self.posting_offsets[sid + 1]]
+
+    def first_station_stops(self, code: str) -> np.ndarray:
+        """Like station_stops, keeping only each train's first call at the station."""
+        stops = self.station_stops(code)
+        _, first = np.unique(self.stop_train[stops], return_index=True)
+        return stops[first]
+
+    def direct_trips(self, from_code: str, to_code: str):
+        """Trains calling at from_code and later at to_code.
+
+        Intersects the two posting lists on train id, using each train's first
+        call at either station. Returns (from_stops, to_stops) global stop
+        indices, ordered by train id.
+        """
+        from_stops = self.first_station_stops(from_code)
+        to_stops = self.first_station_stops(to_code)
+        _, i, j = np.intersect1d(
+            self.stop_train[from_stops], self.stop_train[to_stops],
+            assume_unique=True, return_indices=True,
+        )
+        from_stops, to_stops = from_stops[i], to_stops[j]
+        # Same train, so global stop order is stop_seq order
+        forward = from_stops < to_stops
+        return from_stops[forward], to_stops[forward]
+
+
+def origin_day_offsets(stop_times: StopTimes):
+    """Per-stop departure and arrival as minutes after the origin day's midnight.
+
+    The day counter belongs to the departure, so an arrival whose clock time is
+    after the departure (a halt across midnight) happened the day before.
+    Returns (dep_offset, arr_offset, can_board, can_alight); offsets are 0
+    where the time is missing.
+    """
+    day_start = (stop_times.day.astype(np.int64) - 1) * 1440
+    arr = stop_times.arr.astype(np.int64)
+    dep = stop_times.dep.astype(np.int64)
+    can_board = dep != MISSING_TIME
+    can_alight = arr != MISSING_TIME
+    dep_offset = np.where(can_board, day_start + dep, 0)
+    arr_offset = np.where(can_alight, day_start + arr - np.where(can_board & (arr > dep), 1440, 0), 0)
+    return dep_offset, arr_offset, can_board, can_alight
+
+
+def valid_hops(stop_times: StopTimes, dep_offset, arr_offset, can_board, can_alight) -> np.ndarray:
+    """Stops i whose hop to stop i + 1 can be ridden: same train, both times known, not backwards.
+
+    Takes origin_day_offsets() output.
+    """
+    hop = np.flatnonzero((stop_times.stop_train[:-1] == stop_times.stop_train[1:]) & can_board[:-1] & can_alight[1:])
+    return hop[arr_offset[hop + 1] >= dep_offset[hop]]
+
+
+def hop_chains(n_stops: int, hops: np.ndarray) -> np.ndarray:
+    """Chain id per stop; stops joined by valid hops share one.
+
+    A trip can only be ridden along a chain: a stop with no departure or a
+    backwards time to the next stop ends it, even if the train's later stops
+    have times again.
+    """
+    chain_start = np.ones(n_stops, dtype=bool)
+    chain_start[hops + 1] = False
+    return np.cumsum(chain_start) - 1
+
+
+def build_stop_times(train_df: pd.DataFrame) -> StopTimes:
+    """Flatten the wide station{i}_* schedule into a StopTimes table.
+
+    A train's route ends at its first empty station{i}_code, matching how
+    build_timetable walks the row.
+    """
+    slots = range(1, station_slot_count(train_df) + 1)
+
+    def block(suffix):
+        return train_df[[f"station{i}_{suffix}" for i in slots]].to_numpy(dtype=object)
+
+    codes = block("code")
+    valid = np.logical_and.accumulate(pd.notna(codes), axis=1)
+    lengths = valid.sum(axis=1)
+    offsets = np.zeros(len(train_df) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    stop_codes = codes[valid].astype(str)
+    station_id, station_codes = pd.factorize(stop_codes, sort=True)
+
+    day = pd.to_numeric(block("day")[valid], errors="coerce")
+    dist = pd.to_numeric(block("dist")[valid], errors="coerce")
+    arr_cells, dep_cells = block("arr")[valid], block("dep")[valid]
+    arr, dep = parse_hhmm(arr_cells), parse_hhmm(dep_cells)
+
+    return StopTimes(
+        train_numbers=train_df["trainNumber"].astype(str).str.replace(",", "").to_numpy(dtype=object),
+        train_index=train_df.index.to_numpy(),
+        offsets=offsets,
+        station_codes=np.asarray(station_codes, dtype=object),
+        station_id=station_id.astype(np.int32),
+        stop_name=block("name")[valid],
+        arr=arr,
+        dep=dep,
+        day=np.nan_to_num(day, nan=0).astype(np.int8),
+        dist=np.nan_to_num(dist, nan=MISSING_DIST).astype(np.int32),
+        arr_text=missing_time_text(arr_cells, arr),
+        dep_text=missing_time_text(dep_cells, dep),
+    )
+
+
+def timetable_frame(stop_times: StopTimes, train: int) -> pd.DataFrame:
+    """Full timetable of one train, in the layout the search pages display.
+
+    Stoppage, segment duration, segment distance and segment speed are computed
+    over the train's stop arrays at once instead of per stop.
+    """
+    stops = stop_times.stops(train)
+    arr = stop_times.arr[stops].astype(np.int32)
+    dep = stop_times.dep[stops].astype(np.int32)
+    day = stop_times.day[stops].astype(np.int32)
+    dist = stop_times.dist[stops].astype(np.int64)
+
+    has_stoppage = (arr != MISSING_TIME) & (dep != MISSING_TIME) & (arr != dep)
+    stoppage = [f"{m} min" if ok else "-" for m, ok in zip(((dep - arr) % 1440).tolist(), has_stoppage.tolist())]
+
+    next_arr = np.append(arr[1:], MISSING_TIME)
+    next_day = np.append(day[1:], 0)
+    next_dist = np.append(dist[1:], MISSING_DIST)
+    segment_minutes, has_segment = journey_minutes(dep, day, next_arr, next_day)
+    has_distance = (dist != MISSING_DIST) & (next_dist != MISSING_DIST)
+    segment_dist = next_dist - dist
+    has_speed = has_segment & has_distance & (segment_minutes > 0)
+    speed = (segment_dist / (np.where(has_speed, segment_minutes, 1) / 60)).astype(int)
+
+    return pd.DataFrame({
+        "Station Code": stop_times.station_codes[stop_times.station_id[stops]],
+        "Station Name": stop_times.stop_name[stops],
+        # Marker cells ("Start", "End", ...) are shown as the schedule prints them
+        "Arrival Time": format_schedule_time(arr, stop_times.arr_text[stops]),
+        "Departure Time": format_schedule_time(dep, stop_times.dep_text[stops]),
+        "Day": day.astype(np.int64),
+        "Stoppage Duration": stoppage,
+        "Distance": [str(d) if d != MISSING_DIST else "None" for d in dist.tolist()],
+        "Duration to Next Stn": format_duration(segment_minutes, has_segment),
+        "Distance to Next Stn": [str(d) if ok else "-" for d, ok in zip(segment_dist.tolist(), has_distance.tolist())],
+        "Speed (km/h)": dash_where_invalid(speed, has_speed),
+    })
@@ -133,12 +133,25 @@
 #     st.plotly_chart(fig, use_container_width=True)
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
-from time import sleep
 import os
+import sqlite3
+import threading
+
+from support_functions import geocode_backfill, perf
+from support_functions.spatial_index import EARTH_RADIUS_KM, haversine_km
+
+
+# Only report stations without coordinates; otherwise map_plot also queues them for geocode_backfill
+GEOCODE_OFFLINE = os.environ.get("RAIL_GEOCODE_OFFLINE", "") not in ("", "0")
+
+# Interior stations further than this from the previous one drawn are left off the map
+JUMP_KM = 500
+# Route lines with at least this many points are simplified to within this many km
+SIMPLIFY_MIN_STOPS = 100
+SIMPLIFY_TOLERANCE_KM = 2.0
 
 
 def normalize_station_name(name: str) -> str:
@@ -164,92 +177,64 @@ def normalize_station_name(name: str) -> str:
     )
 
 
-def map_plot(df):
-    @st.cache_data(show_spinner=False)
-    def get_or_geocode_stations(stations):
-        coord_file = os.path.join(os.getcwd(), "database/station_index_with_coords.csv")
-
-        if os.path.exists(coord_file):
-            coord_df = pd.read_csv(coord_file)
-        else:
-            coord_df = pd.DataFrame(columns=["stationCode", "stationName", "Latitude", "Longitude"])
-
-        geolocator = Nominatim(user_agent="streamlit-train-route")
-        results = []
-        updated = False
-
-        # Normalize existing station names
-        coord_df["__norm"] = coord_df["stationName"].apply(normalize_station_name)
-
-        for stn in stations:
-            normalized = normalize_station_name(stn)
-
-            matched = coord_df[coord_df["__norm"] == normalized]
-            if not matched.empty and pd.notna(matched.iloc[0]["Latitude"]) and pd.notna(matched.iloc[0]["Longitude"]):
-                lat, lon = matched.iloc[0]["Latitude"], matched.iloc[0]["Longitude"]
-                results.append((stn, lat, lon))
-                continue
-
-            # Try geocoding if not matched
-            query = f"{normalized} Railway Station, India"
-            try:
-                location = geolocator.geocode(query, timeout=10)
-                if location:
-                    lat, lon = location.latitude, location.longitude
-                    if 6 <= lat <= 38 and 68 <= lon <= 97:
-                        results.append((stn, lat, lon))
-                        # Add to coord_df
-                        new_entry = pd.DataFrame([{
-                            "stationCode": None,
-                            "stationName": stn,
-                            "Latitude": lat,
-                            "Longitude": lon
-                        }])
-                        coord_df = pd.concat([coord_df, new_entry], ignore_index=True)
-                        updated = True
-                    else:
-                        st.warning(f"⚠️ {stn} geocoded outside India: ({lat}, {lon})")
-            except Exception:
-                pass
-            sleep(1)
-
-        # Save if updated
-        if updated:
-            coord_df.drop(columns="__norm", errors="ignore", inplace=True)
-            coord_df.drop_duplicates(subset="stationName", inplace=True)
-            coord_df.to_csv(coord_file, index=False)
-            st.success("💾 Updated station_index_with_coords.csv with new coordinates.")
-
-        return pd.DataFrame(results, columns=["Station Name", "Latitude", "Longitude"])
-
-    # Begin plotting logic
-    station_names = df["Station Name"].dropna().unique().tolist()
-    geo_df = get_or_geocode_stations(station_names)
-
-    if len(geo_df) < 2:
-        st.warning("Not enough stations to draw a route.")
-        return
-
-    # Normalize names before plotting
-    geo_df["Station Name"] = geo_df["Station Name"].apply(normalize_station_name)
-
-    # Filter out jumps > 500 km, but keep first and last always
-    filtered_points = [geo_df.iloc[0]]
-    for i in range(1, len(geo_df) - 1):
-        prev = (filtered_points[-1]["Latitude"], filtered_points[-1]["Longitude"])
-        curr = (geo_df.iloc[i]["Latitude"], geo_df.iloc[i]["Longitude"])
-        distance_km = geodesic(prev, curr).km
-        if distance_km <= 500:
-            filtered_points.append(geo_df.iloc[i])
-
-    if len(geo_df) > 1:
-        filtered_points.append(geo_df.iloc[-1])  # Always include last station
-
-    geo_df = pd.DataFrame(filtered_points)
-
+class CoordIndex:
+    """Station coordinates by code and by normalized name, from station_index_with_coords.csv."""
+
+    def __init__(self, coord_df: pd.DataFrame):
+        known = coord_df[coord_df["Latitude"].notna() & coord_df["Longitude"].notna()]
+        points = list(zip(known["Latitude"].astype(float), known["Longitude"].astype(float)))
+        codes = known["stationCode"].astype(str).str.strip().str.upper().where(known["stationCode"].notna())
+        names = known["stationName"].apply(normalize_station_name)
+        # First row wins for both keys, as in the CSV's own order
+        self.by_code = {}
+        self.by_name = {}
+        for code, name, point in zip(codes, names, points):
+            if isinstance(code, str):
+                self.by_code.setdefault(code, point)
+            self.by_name.setdefault(name, point)
+
+    def get(self, code=None, name=None):
+        """(lat, lon) for a station, by code first and then by normalized name; None if unknown."""
+        if code is not None:
+            point = self.by_code.get(str(code).strip().upper())
+            if point is not None:
+                return point
+        if name is not None:
+            return self.by_name.get(normalize_station_name(name))
+        return None
+
+
+_coord_indexes = {}
+_coord_lock = threading.Lock()
+
+
+def coord_index(coord_file: str = None) -> CoordIndex:
+    """The process-wide CoordIndex for coord_file, rebuilt only when the file changes."""
+    coord_file = coord_file or os.path.join(os.getcwd(), "database/station_index_with_coords.csv")
+    try:
+        version = os.stat(coord_file).st_mtime_ns
+    except OSError:
+        version = None
+    cached = _coord_indexes.get(coord_file)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _coord_lock:
+        cached = _coord_indexes.get(coord_file)
+        if cached is None or cached[0] != version:
+            if version is None:
+                coord_df = pd.DataFrame(columns=["stationCode", "stationName", "Latitude", "Longitude"])
+            else:
+                coord_df = pd.read_csv(coord_file)
+            cached = (version, CoordIndex(coord_df))
+            _coord_indexes[coord_file] = cached
+    return cached[1]
+
+
+def map_view(lat, lon):
+    """Map center and zoom that fit the given points."""
     # Calculate map center
-    min_lat, max_lat = geo_df["Latitude"].min(), geo_df["Latitude"].max()
-    min_lon, max_lon = geo_df["Longitude"].min(), geo_df["Longitude"].max()
+    min_lat, max_lat = lat.min(), lat.max()
+    min_lon, max_lon = lon.min(), lon.max()
     center_lat = (min_lat + max_lat) / 2
     center_lon = (min_lon + max_lon) / 2
 
@@ -281,31 +266,207 @@ def map_plot(df):
         zoom = 2
     else:
         zoom = 1
-        
-    # st.write(zoom)
+    return center_lat, center_lon, zoom
+
+
+def jump_filter(lat: np.ndarray, lon: np.ndarray, max_km: float = JUMP_KM) -> np.ndarray:
+    """Mask of the points to draw: an interior point is dropped when it is more
+    than max_km from the last point kept; the first and last are always kept."""
+    n = len(lat)
+    keep = np.ones(n, dtype=bool)
+    if n < 3:
+        return keep
+    # jumps[i] -> the hop from point i into interior point i + 1 is too long
+    jumps = np.flatnonzero(haversine_km(lat[:-2], lon[:-2], lat[1:-1], lon[1:-1]) > max_km)
+    last = 0
+    while True:
+        # Every point from `last` up to the next long hop is kept as it comes
+        at = np.searchsorted(jumps, last)
+        if at == len(jumps):
+            return keep
+        last = jumps[at]
+        # Skip ahead to the first interior point close enough to `last`
+        close = np.flatnonzero(haversine_km(lat[last], lon[last], lat[last + 1:-1], lon[last + 1:-1]) <= max_km)
+        if not len(close):
+            keep[last + 1:-1] = False
+            return keep
+        keep[last + 1:last + 1 + close[0]] = False
+        last = last + 1 + close[0]
+
+
+def simplify_route(lat: np.ndarray, lon: np.ndarray, tolerance_km: float) -> np.ndarray:
+    """Mask of the points Douglas–Peucker keeps for a line within tolerance_km of the original."""
+    n = len(lat)
+    if n < 3 or tolerance_km <= 0:
+        return np.ones(n, dtype=bool)
+    # Flat projection around the route's mean latitude, in km
+    y = np.radians(lat) * EARTH_RADIUS_KM
+    x = np.radians(lon) * EARTH_RADIUS_KM * np.cos(np.radians(np.mean(lat)))
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    segments = [(0, n - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        offset = np.abs(dx * py - dy * px) / length if length else np.hypot(px, py)
+        furthest = int(np.argmax(offset))
+        if offset[furthest] > tolerance_km:
+            mid = start + 1 + furthest
+            keep[mid] = True
+            segments += [(start, mid), (mid, end)]
+    return keep
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def route_geometry(train_number, route: tuple, simplify_km: float = None):
+    """What route_figure draws for route ((name, lat, lon) per station, in order); None below two stations.
+
+    Cached per train number and route, so a repeat view of a train, or a
+    coordinates update for its stations, only redoes the filtering when needed.
+    st.cache_data hands every caller its own copy.
+    """
+    perf.cache_miss()
+    if len(route) < 2:
+        return None
+    geo_df = pd.DataFrame(list(route), columns=["Station Name", "Latitude", "Longitude"])
+
+    # Normalize names before plotting
+    geo_df["Station Name"] = geo_df["Station Name"].apply(normalize_station_name)
 
+    # Filter out jumps > 500 km, but keep first and last always
+    geo_df = geo_df[jump_filter(geo_df["Latitude"].to_numpy(), geo_df["Longitude"].to_numpy())]
+
+    # Long routes get a lighter line; every station keeps its marker
+    if simplify_km is None:
+        simplify_km = SIMPLIFY_TOLERANCE_KM if len(geo_df) >= SIMPLIFY_MIN_STOPS else 0
+    line_df = geo_df[simplify_route(geo_df["Latitude"].to_numpy(), geo_df["Longitude"].to_numpy(), simplify_km)]
+
+    center_lat, center_lon, zoom = map_view(geo_df["Latitude"], geo_df["Longitude"])
+    return {
+        "stations": geo_df.reset_index(drop=True),
+        "line": line_df.reset_index(drop=True),
+        "center": {"lat": center_lat, "lon": center_lon},
+        "zoom": zoom,
+    }
+
+
+def route_figure(geometry: dict):
+    """Plotly map of a route_geometry; a new figure per render, so no session shares one."""
     fig = px.scatter_mapbox(
-        geo_df,
+        geometry["stations"],
         lat="Latitude",
         lon="Longitude",
         hover_name="Station Name",
         mapbox_style="carto-positron",
         height=400,
         width=600,
-        zoom=zoom
+        zoom=geometry["zoom"]
     )
 
+    line_df = geometry["line"]
     fig.add_scattermapbox(
-        lat=geo_df["Latitude"],
-        lon=geo_df["Longitude"],
+        lat=line_df["Latitude"],
+        lon=line_df["Longitude"],
         mode="lines+markers",
         line=dict(color="blue", width=4),
         marker=dict(size=10),
-        text=geo_df["Station Name"],
+        text=line_df["Station Name"],
         hoverinfo="text",
         name="Train Route"
     )
 
+    fig.update_layout(
+        mapbox=dict(center=geometry["center"], zoom=geometry["zoom"]),
+        margin=dict(l=0, r=0, t=0, b=0),
+        showlegend=False
+    )
+    return fig
+
+
+@perf.timed("map_plot")
+def map_plot(df, train_number=None, offline=None, simplify_km=None):
+    """Route map of a timetable. Never geocodes: stations missing from the
+    coordinates file are listed and, unless offline (default GEOCODE_OFFLINE),
+    queued for the geocode_backfill job.
+
+    The route's geometry is cached per train_number (see route_geometry); simplify_km=0
+    turns off line simplification for long routes.
+    """
+    offline = GEOCODE_OFFLINE if offline is None else offline
+
+    stations = df.dropna(subset=["Station Name"]).drop_duplicates(subset="Station Name")
+    station_names = stations["Station Name"].tolist()
+    station_codes = stations["Station Code"].tolist() if "Station Code" in stations else [None] * len(stations)
+    with perf.stage("geocode_lookup", rows=len(station_names)):
+        index = coord_index()
+        points = [index.get(code, name) for code, name in zip(station_codes, station_names)]
+
+    missing = [(code, name) for code, name, point in zip(station_codes, station_names, points) if point is None]
+    if missing and not offline:
+        try:
+            geocode_backfill.queue_stations(missing)
+        except sqlite3.Error:
+            pass
+    if missing:
+        missing = [name for _, name in missing]
+        st.caption(f"📍 No coordinates for {len(missing)} station(s): {', '.join(map(str, missing))}")
+
+    route = tuple((name, *point) for name, point in zip(station_names, points) if point is not None)
+    with perf.stage("route_geometry", rows=len(route), cached=True):
+        geometry = route_geometry(None if train_number is None else str(train_number), route, simplify_km)
+    if geometry is None:
+        st.warning("Not enough stations to draw a route.")
+        return
+
+    with perf.stage("route_figure", rows=len(geometry["stations"])):
+        fig = route_figure(geometry)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def isochrone_plot(reach_df, station_df, origin_code):
+    """Reachable stations coloured by travel time, on the same mapbox as map_plot.
+
+    reach_df is support_functions.journey_planner.reachable_frame output; station
+    coordinates come from station_df (stations without coordinates are left out).
+    """
+    coords = station_df.dropna(subset=["Latitude", "Longitude"]).set_index("stationCode")[["Latitude", "Longitude"]]
+    geo_df = reach_df.join(coords, on="Station Code", how="inner")
+    if geo_df.empty:
+        st.warning("None of the reachable stations have coordinates yet.")
+        return
+    geo_df["Hours"] = (geo_df["minutes"] / 60).round(1)
+
+    center_lat, center_lon, zoom = map_view(geo_df["Latitude"], geo_df["Longitude"])
+    fig = px.scatter_mapbox(
+        geo_df,
+        lat="Latitude",
+        lon="Longitude",
+        color="Hours",
+        color_continuous_scale="Viridis_r",
+        hover_name="Station Name",
+        hover_data={"Arrival": True, "Changes": True, "Trains": True, "Latitude": False, "Longitude": False},
+        mapbox_style="carto-positron",
+        height=500,
+        zoom=zoom
+    )
+    fig.update_traces(marker=dict(size=9))
+
+    if origin_code in coords.index:
+        origin = coords.loc[[origin_code]]
+        fig.add_scattermapbox(
+            lat=origin["Latitude"],
+            lon=origin["Longitude"],
+            mode="markers",
+            marker=dict(size=16, color="red"),
+            text=[origin_code],
+            hoverinfo="text",
+            name="Origin"
+        )
+
     fig.update_layout(
         mapbox=dict(center={"lat": center_lat, "lon": center_lon}, zoom=zoom),
         margin=dict(l=0, r=0, t=0, b=0),
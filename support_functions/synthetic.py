@@ -0,0 +1,321 @@
+"""Synthetic schedules for load and scale testing.
+
+Trains run between real stations from station_index_with_coords.csv: each
+route is laid along the line from a random origin to a destination 100-3000 km
+away, with some sideways wander, and every point is snapped to the nearest
+real station. Distances follow the stations' coordinates, running times come
+from a per-train speed, and halts from a per-train dwell range. runningOn,
+train_type and journeyClasses are drawn together from a real schedule's rows.
+
+Output is produced a chunk of trains at a time, each chunk from its own
+generator seeded with (seed, chunk number), so a given seed and chunk size
+always gives the same schedule and 1M trains never sit in memory at once.
+
+    python -m support_functions.synthetic --trains 1000000 --wide wide.csv --long long.parquet
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from support_functions.spatial_index import haversine_km
+from support_functions.stop_times import HHMM_TEXT, MISSING_TIME, StopTimes
+
+
+CHUNK_TRAINS = 10_000
+MAX_STOPS = 64
+FIRST_TRAIN_NUMBER = 100_000
+INDIA = (6.0, 38.0, 68.0, 98.0)     # lat min / max, lon min / max
+GRID_DEGREES = 0.25
+TRACK_DETOUR = 1.15                 # track km per great-circle km
+
+# (share, speed km/h mean / sd, km between stops, dwell minutes low / high, name)
+SERVICES = [
+    (0.65, 58, 12, 35, 2, 10, "Express"),
+    (0.35, 36, 7, 12, 1, 3, "Passenger"),
+]
+HEADER_COLUMNS = ["runningOn", "train_type", "journeyClasses"]
+DEFAULT_HEADERS = pd.DataFrame({
+    "runningOn": ["YYYYYYY", "YNNNNNN", "NYNNNNN"],
+    "train_type": ["O", "O", "SP"],
+    "journeyClasses": ["1A, 2A, 3A, SL", "2A, 3A, SL", "CC, 2S"],
+})
+SLOT_FIELDS = ["stn_no", "code", "name", "arr", "dep", "day", "dist", "halt_duration"]
+HALT_TEXT = np.array([f"{m:02d}:00" for m in range(100)] + ["--"], dtype=object)
+
+
+class StationPool:
+    """Stations with coordinates, sorted by code, and a grid for nearest-station snapping."""
+
+    def __init__(self, coords_csv: str):
+        stations = pd.read_csv(coords_csv).dropna(subset=["stationCode", "Latitude", "Longitude"])
+        stations["stationCode"] = stations["stationCode"].astype(str).str.upper()
+        lat_min, lat_max, lon_min, lon_max = INDIA
+        stations = stations[stations["Latitude"].between(lat_min, lat_max) & stations["Longitude"].between(lon_min, lon_max)]
+        stations = stations.drop_duplicates(subset="stationCode").sort_values("stationCode")
+        self.codes = stations["stationCode"].to_numpy(dtype=object)
+        self.names = stations["stationName"].astype(str).str.title().to_numpy(dtype=object)
+        self.lat = stations["Latitude"].to_numpy()
+        self.lon = stations["Longitude"].to_numpy()
+
+        # Nearest station to every grid cell center, found once by brute force
+        self.rows = int(np.ceil((lat_max - lat_min) / GRID_DEGREES))
+        self.cols = int(np.ceil((lon_max - lon_min) / GRID_DEGREES))
+        cell_lat = lat_min + (np.arange(self.rows * self.cols) // self.cols + 0.5) * GRID_DEGREES
+        cell_lon = lon_min + (np.arange(self.rows * self.cols) % self.cols + 0.5) * GRID_DEGREES
+        self.nearest = np.empty(self.rows * self.cols, dtype=np.int32)
+        for lo in range(0, len(cell_lat), 2048):
+            d = haversine_km(cell_lat[lo:lo + 2048, None], cell_lon[lo:lo + 2048, None], self.lat, self.lon)
+            self.nearest[lo:lo + 2048] = d.argmin(axis=1)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def snap(self, lat, lon) -> np.ndarray:
+        lat_min, lat_max, lon_min, lon_max = INDIA
+        row = np.clip(((lat - lat_min) / GRID_DEGREES).astype(int), 0, self.rows - 1)
+        col = np.clip(((lon - lon_min) / GRID_DEGREES).astype(int), 0, self.cols - 1)
+        return self.nearest[row * self.cols + col]
+
+
+def header_sampler(schedule_csv: str = None) -> pd.DataFrame:
+    """runningOn / train_type / journeyClasses rows to draw from."""
+    if schedule_csv and os.path.exists(schedule_csv):
+        return pd.read_csv(schedule_csv, usecols=HEADER_COLUMNS).dropna().reset_index(drop=True)
+    return DEFAULT_HEADERS
+
+
+def _routes(pool: StationPool, rng, n: int, max_stops: int):
+    """Station ids of n routes back to back, with (lengths, service) per route."""
+    service = rng.choice(len(SERVICES), n, p=[s[0] for s in SERVICES])
+    origin = rng.integers(0, len(pool), n)
+    length_km = np.exp(rng.uniform(np.log(100), np.log(3000), n))
+    bearing = rng.uniform(0, 2 * np.pi, n)
+    lat0, lon0 = pool.lat[origin], pool.lon[origin]
+    dlat = length_km * np.cos(bearing) / 111.0
+    dlon = length_km * np.sin(bearing) / (111.0 * np.cos(np.radians(lat0)))
+    destination = pool.snap(lat0 + dlat, lon0 + dlon)
+    lat1, lon1 = pool.lat[destination], pool.lon[destination]
+
+    spacing = np.array([s[3] for s in SERVICES])[service]
+    km = haversine_km(lat0, lon0, lat1, lon1)
+    interior = np.clip(np.round(km / spacing).astype(int), 0, max_stops - 2)
+
+    # Sorted positions along the route: random draws past each train's count are pushed to the end
+    t = rng.random((n, max_stops - 2))
+    t[np.arange(max_stops - 2) >= interior[:, None]] = np.inf
+    t.sort(axis=1)
+    t = np.concatenate([np.zeros((n, 1)), t, np.full((n, 1), np.inf)], axis=1)
+    t[np.arange(n), interior + 1] = 1.0
+    valid = np.isfinite(t)
+
+    # Wander sideways, most in the middle of the route
+    wander = rng.normal(0, 0.04, (n, 1)) * np.sin(np.pi * np.where(valid, t, 0))
+    lat = lat0[:, None] + np.where(valid, t, 0) * (lat1 - lat0)[:, None] + wander * (lon1 - lon0)[:, None]
+    lon = lon0[:, None] + np.where(valid, t, 0) * (lon1 - lon0)[:, None] - wander * (lat1 - lat0)[:, None]
+    stations = pool.snap(lat, lon)
+    stations[:, 0] = origin
+
+    # A train calls at a station at most once: drop later repeats
+    flat_train = np.repeat(np.arange(n), max_stops)[valid.ravel()]
+    flat_station = stations[valid]
+    _, first = np.unique(flat_train.astype(np.int64) * len(pool) + flat_station, return_index=True)
+    keep = np.zeros(len(flat_station), dtype=bool)
+    keep[first] = True
+    lengths = np.bincount(flat_train[keep], minlength=n)
+    return flat_station[keep], lengths, service
+
+
+def generate(pool: StationPool, headers: pd.DataFrame, n_trains: int, seed: int = 0,
+             chunk_trains: int = CHUNK_TRAINS, max_stops: int = MAX_STOPS):
+    """Yield (trains, stops) DataFrames per chunk.
+
+    trains has the wide schedule's header columns; stops is the long format,
+    one row per call: trainNumber, stn_no, code, name, arr, dep, day, dist,
+    halt_duration, plus the integer minutes arr_min / dep_min (-1 if none).
+    """
+    for chunk, lo in enumerate(range(0, n_trains, chunk_trains)):
+        rng = np.random.default_rng([seed, chunk])
+        n = min(chunk_trains, n_trains - lo)
+
+        # Routes that snapped onto a single station are drawn again
+        station, lengths, service = _routes(pool, rng, n, max_stops)
+        while (lengths < 2).any():
+            redo = np.flatnonzero(lengths < 2)
+            more, more_lengths, more_service = _routes(pool, rng, len(redo), max_stops)
+            parts = np.split(station, np.cumsum(lengths)[:-1])
+            more_parts = np.split(more, np.cumsum(more_lengths)[:-1])
+            for i, part in zip(redo, more_parts):
+                parts[i] = part
+            station = np.concatenate(parts)
+            lengths[redo], service[redo] = more_lengths, more_service
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        train = np.repeat(np.arange(n), lengths)
+        seq = np.arange(len(station)) - offsets[train]
+        first, last = seq == 0, seq == lengths[train] - 1
+
+        # Distance along the track, at least 1 km per hop
+        hop = np.zeros(len(station))
+        hop[1:] = haversine_km(pool.lat[station[:-1]], pool.lon[station[:-1]], pool.lat[station[1:]], pool.lon[station[1:]])
+        hop = np.where(first, 0, np.maximum(np.round(hop * TRACK_DETOUR), 1))
+        dist = np.cumsum(hop)
+        dist = (dist - dist[offsets[train]]).astype(np.int32)
+
+        # Running time from a per-train speed, halts from the service's dwell range
+        table = np.array([s[1:6] for s in SERVICES], dtype=float)
+        speed = np.maximum(rng.normal(table[service, 0], table[service, 1]), 15)
+        dwell_low, dwell_high = table[service, 3].astype(int), table[service, 4].astype(int)
+        run = np.ceil(hop / speed[train] * 60).astype(np.int64)
+        dwell = rng.integers(dwell_low[train], dwell_high[train] + 1)
+        dwell[first | last] = 0
+        start = rng.integers(0, 288, n) * 5
+        elapsed = np.cumsum(run + dwell)
+        dep_abs = start[train] + elapsed - elapsed[offsets[train]]
+        arr_abs = dep_abs - dwell
+        arr_min = np.where(first, MISSING_TIME, arr_abs % 1440)
+        dep_min = np.where(last, MISSING_TIME, dep_abs % 1440)
+        # The day counter follows the departure (the arrival at the last stop)
+        day = 1 + np.where(last, arr_abs, dep_abs) // 1440
+
+        numbers = FIRST_TRAIN_NUMBER + lo + np.arange(n)
+        sample = headers.iloc[rng.integers(0, len(headers), n)].reset_index(drop=True)
+        origin, destination = station[offsets[:-1]], station[offsets[1:] - 1]
+        suffix = np.array([s[6] for s in SERVICES], dtype=object)[service]
+        trains = pd.DataFrame({
+            "trainNumber": numbers,
+            "trainName": pool.names[origin] + " - " + pool.names[destination] + " " + suffix,
+            "origin": pool.names[origin],
+            "destination": pool.names[destination],
+            "stationFrom": pool.codes[origin],
+            "stationTo": pool.codes[destination],
+            "runningOn": sample["runningOn"].to_numpy(),
+            "train_type": sample["train_type"].to_numpy(),
+            "journeyClasses": sample["journeyClasses"].to_numpy(),
+        })
+        stops = pd.DataFrame({
+            "trainNumber": numbers[train],
+            "stn_no": seq + 1,
+            "code": pool.codes[station],
+            "name": pool.names[station],
+            "arr": HHMM_TEXT[arr_min],
+            "dep": HHMM_TEXT[dep_min],
+            "day": day,
+            "dist": dist,
+            "halt_duration": HALT_TEXT[np.where(first | last, -1, np.minimum(dwell, 99))],
+            "arr_min": arr_min.astype(np.int16),
+            "dep_min": dep_min.astype(np.int16),
+            "station": station,
+        })
+        yield trains, stops
+
+
+def to_wide(trains: pd.DataFrame, stops: pd.DataFrame, max_stops: int = MAX_STOPS) -> pd.DataFrame:
+    """The wide station{i}_* layout of reserved_train_schedule.csv, max_stops slots per row."""
+    row = np.searchsorted(trains["trainNumber"].to_numpy(), stops["trainNumber"].to_numpy())
+    slot = stops["stn_no"].to_numpy() - 1
+    columns = {name: trains[name].to_numpy() for name in trains.columns}
+    for field in SLOT_FIELDS:
+        values = stops[field].to_numpy()
+        numeric = field in ("stn_no", "day", "dist")
+        grid = np.full((len(trains), max_stops), np.nan if numeric else None, dtype=float if numeric else object)
+        grid[row, slot] = values
+        for i in range(max_stops):
+            columns[f"station{i + 1}_{field}"] = grid[:, i]
+    # Same column order as the bundled schedules: all fields of slot 1, then slot 2, ...
+    order = list(trains.columns) + [f"station{i + 1}_{field}" for i in range(max_stops) for field in SLOT_FIELDS]
+    return pd.DataFrame(columns)[order]
+
+
+def synthetic_stop_times(pool: StationPool, headers: pd.DataFrame, n_trains: int, seed: int = 0,
+                         chunk_trains: int = CHUNK_TRAINS, max_stops: int = MAX_STOPS):
+    """(train header frame, StopTimes) of a synthetic schedule, built in memory without the wide layout.
+
+    The header frame is enough for build_train_summary.
+    """
+    trains, stops = zip(*generate(pool, headers, n_trains, seed, chunk_trains, max_stops))
+    trains = pd.concat(trains, ignore_index=True)
+    stops = pd.concat(stops, ignore_index=True)
+    lengths = np.bincount(np.searchsorted(trains["trainNumber"].to_numpy(), stops["trainNumber"].to_numpy()),
+                          minlength=len(trains))
+    offsets = np.zeros(len(trains) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    stop_times = StopTimes(
+        train_numbers=trains["trainNumber"].astype(str).to_numpy(dtype=object),
+        train_index=trains.index.to_numpy(),
+        offsets=offsets,
+        station_codes=pool.codes,
+        station_id=stops["station"].to_numpy(dtype=np.int32),
+        stop_name=stops["name"].to_numpy(dtype=object),
+        arr=stops["arr_min"].to_numpy(),
+        dep=stops["dep_min"].to_numpy(),
+        day=stops["day"].to_numpy(dtype=np.int8),
+        dist=stops["dist"].to_numpy(dtype=np.int32),
+    )
+    return trains, stop_times
+
+
+class _ChunkWriter:
+    """Appends frames to a CSV (header once) or a Parquet file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = None
+        self._started = False
+
+    def write(self, frame: pd.DataFrame):
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            frame.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False)
+        self._started = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def write_schedule(database_dir: str, n_trains: int, wide: str = None, long: str = None, seed: int = 0,
+                   chunk_trains: int = CHUNK_TRAINS, max_stops: int = MAX_STOPS):
+    """Stream a synthetic schedule to a wide CSV and/or a long CSV / Parquet file."""
+    pool = StationPool(os.path.join(database_dir, "station_index_with_coords.csv"))
+    headers = header_sampler(os.path.join(database_dir, "reserved_train_schedule.csv"))
+    wide_writer = _ChunkWriter(wide) if wide else None
+    long_writer = _ChunkWriter(long) if long else None
+    start = time.perf_counter()
+    n_stops = 0
+    try:
+        for trains, stops in generate(pool, headers, n_trains, seed, chunk_trains, max_stops):
+            n_stops += len(stops)
+            if wide_writer:
+                wide_writer.write(to_wide(trains, stops, max_stops))
+            if long_writer:
+                long_writer.write(stops.drop(columns=["arr_min", "dep_min", "station"]))
+    finally:
+        for writer in (wide_writer, long_writer):
+            if writer:
+                writer.close()
+    print(f"{n_trains} trains, {n_stops} stops in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=os.path.join(os.getcwd(), "database"))
+    parser.add_argument("--trains", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--wide", default=None, help="wide-format CSV path")
+    parser.add_argument("--long", default=None, help="long-format CSV or .parquet path")
+    parser.add_argument("--chunk", type=int, default=CHUNK_TRAINS, help="trains per chunk")
+    parser.add_argument("--max-stops", type=int, default=MAX_STOPS)
+    args = parser.parse_args()
+    if not (args.wide or args.long):
+        parser.error("give --wide and/or --long")
+    write_schedule(args.database, args.trains, args.wide, args.long, args.seed, args.chunk, args.max_stops)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+
+GRAM = 3
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class TrigramIndex:
+    """Case-insensitive substring index over one or more aligned text fields.
+
+    Documents are row positions; a document matches when any of its fields
+    contains the query. Postings are kept as sorted arrays (gram -> doc ids)
+    so the index pickles cheaply through st.cache_data.
+    """
+
+    def __init__(self, *fields):
+        self.fields = [pd.Series(field, dtype=object).astype(str).str.lower().to_numpy() for field in fields]
+        self.n_docs = len(self.fields[0]) if self.fields else 0
+
+        pairs = {
+            (gram, doc)
+            for field in self.fields
+            for doc, text in enumerate(field)
+            for gram in trigrams(text)
+        }
+        grams = np.array([gram for gram, _ in pairs], dtype=f"<U{GRAM}")
+        docs = np.array([doc for _, doc in pairs], dtype=np.int32)
+        order = np.lexsort((docs, grams))
+        grams, self.docs = grams[order], docs[order]
+
+        self.grams, starts = np.unique(grams, return_index=True)
+        self.offsets = np.append(starts, len(grams)).astype(np.int64)
+
+    def postings(self, gram: str) -> np.ndarray:
+        i = np.searchsorted(self.grams, gram)
+        if i == len(self.grams) or self.grams[i] != gram:
+            return np.empty(0, dtype=np.int32)
+        return self.docs[self.offsets[i]:self.offsets[i + 1]]
+
+    def candidates(self, query: str) -> np.ndarray:
+        """Doc ids containing every trigram of query (a superset of the true matches)."""
+        lists = sorted((self.postings(gram) for gram in trigrams(query.lower())), key=len)
+        result = lists[0]
+        for postings in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, postings, assume_unique=True)
+        return result
+
+    def search(self, query: str, docs=None):
+        """Docs whose fields contain query, ranked by earliest match position.
+
+        Queries of GRAM characters or more go through the trigram postings;
+        shorter ones scan the (optionally pre-filtered) docs directly. Ties keep
+        doc order. Returns (doc ids, match positions).
+        """
+        query = query.lower()
+        if docs is None:
+            docs = np.arange(self.n_docs, dtype=np.int32)
+        if len(query) >= GRAM:
+            docs = np.intersect1d(self.candidates(query), docs, assume_unique=True)
+
+        position = np.full(len(docs), np.iinfo(np.int32).max, dtype=np.int64)
+        for field in self.fields:
+            found = pd.Series(field[docs], dtype=object).str.find(query).to_numpy()
+            position = np.where((found >= 0) & (found < position), found, position)
+        hit = position != np.iinfo(np.int32).max
+        docs, position = docs[hit], position[hit]
+        order = np.argsort(position, kind="stable")
+        return docs[order], position[order]
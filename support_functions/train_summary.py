@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from support_functions.stop_times import (
+    MISSING_DIST, StopTimes, dash_where_invalid, format_duration, format_hhmm, journey_minutes,
+)
+
+
+DAYS = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
+ALL_DAYS_MASK = (1 << len(DAYS)) - 1
+# Bit positions for journey classes; anything else is ignored by the class filter
+JOURNEY_CLASSES = ["1A", "2A", "3A", "3E", "CC", "SL", "FC", "EV", "VS", "EA", "2S", "EC", "EX"]
+CLASS_BITS = {cls: 1 << i for i, cls in enumerate(JOURNEY_CLASSES)}
+
+
+def parse_running_days(running_on: str) -> str:
+    return ', '.join(day for day, status in zip(DAYS, running_on) if status == 'Y')
+
+
+def running_days_mask(running_on: str) -> int:
+    """"YNNNNNY" -> 7-bit mask, bit i set when the train runs on DAYS[i]."""
+    return sum(1 << i for i, status in enumerate(str(running_on)[:len(DAYS)]) if status == 'Y')
+
+
+def days_mask(days) -> int:
+    return sum(1 << DAYS.index(day) for day in days if day in DAYS)
+
+
+def class_mask(classes) -> int:
+    return sum(CLASS_BITS.get(str(cls).strip().upper(), 0) for cls in classes)
+
+
+def filter_trains(train_summary: pd.DataFrame, running_days=None, classes=None, match_all_days=False) -> np.ndarray:
+    """Boolean row mask over train_summary for the pages' day and class filters.
+
+    running_days holds day names and/or "Daily" ("Daily" means all seven days).
+    Otherwise a train must run on any of the days, or on all of them with
+    match_all_days. classes match if the train has any of them.
+    """
+    keep = np.ones(len(train_summary), dtype=bool)
+    if running_days:
+        train_days = train_summary["days_mask"].to_numpy()
+        if "Daily" in running_days:
+            keep &= train_days == ALL_DAYS_MASK
+        else:
+            wanted = days_mask(running_days)
+            keep &= (train_days & wanted) == wanted if match_all_days else (train_days & wanted) != 0
+    if classes:
+        keep &= (train_summary["class_mask"].to_numpy() & class_mask(classes)) != 0
+    return keep
+
+
+def build_train_summary(train_df: pd.DataFrame, stop_times: StopTimes) -> pd.DataFrame:
+    """One row per train (indexed by StopTimes train id) with its end-to-end figures.
+
+    Display columns use the search pages' headings and formatting; the lowercase
+    columns hold the same figures typed for filtering and joins. Trains without
+    any stops are left out.
+    """
+    lengths = np.diff(stop_times.offsets)
+    trains = np.flatnonzero(lengths > 0)
+    first = stop_times.offsets[trains]
+    last = stop_times.offsets[trains + 1] - 1
+    codes = stop_times.station_codes[stop_times.station_id]
+    rows = train_df.loc[stop_times.train_index[trains]]
+
+    total_minutes, valid = journey_minutes(
+        stop_times.dep[first], stop_times.day[first],
+        stop_times.arr[last], stop_times.day[last],
+    )
+    from_dist = stop_times.dist[first]
+    to_dist = stop_times.dist[last]
+    has_distance = valid & (from_dist != MISSING_DIST) & (to_dist != MISSING_DIST)
+    total_distance = to_dist - from_dist
+    has_speed = has_distance & (total_minutes > 0)
+    average_speed = (total_distance / (np.where(has_speed, total_minutes, 1) / 60)).astype(int)
+
+    running_on = rows["runningOn"].astype(str)
+    running_days = {value: parse_running_days(value) for value in running_on.unique()}
+    days_masks = {value: running_days_mask(value) for value in running_on.unique()}
+    journey_classes = rows["journeyClasses"].astype(str)
+    class_masks = {value: class_mask(value.split(",")) for value in journey_classes.unique()}
+
+    summary = pd.DataFrame({
+        "Train No": stop_times.train_numbers[trains],
+        "Train Name": rows["trainName"].astype(str).to_numpy(),
+        "Origin": codes[first] + " - " + stop_times.stop_name[first],
+        "Destination": codes[last] + " - " + stop_times.stop_name[last],
+        "Departure": format_hhmm(stop_times.dep[first]),
+        "Arrival": format_hhmm(stop_times.arr[last]),
+        "Duration": format_duration(total_minutes, valid),
+        "Distance (km)": dash_where_invalid(total_distance, has_distance).to_numpy(),
+        "Avg Speed (km/h)": dash_where_invalid(average_speed, has_speed).to_numpy(),
+        "Running On": running_on.map(running_days).to_numpy(),
+        "Train Type": rows["train_type"].to_numpy(),
+        "Classes": rows["journeyClasses"].to_numpy(),
+        "train_df_index": stop_times.train_index[trains],
+        "runningOn": running_on.to_numpy(),
+        "days_mask": running_on.map(days_masks).to_numpy(dtype=np.uint8),
+        "class_mask": journey_classes.map(class_masks).to_numpy(dtype=np.int32),
+        "duration_min": pd.arrays.IntegerArray(total_minutes.astype(np.int32), ~valid),
+        "distance_km": pd.arrays.IntegerArray(total_distance.astype(np.int32), ~has_distance),
+        "speed_kmh": pd.arrays.IntegerArray(average_speed.astype(np.int32), ~has_speed),
+    }, index=pd.Index(trains, name="train"))
+    return summary